@@ -2,17 +2,25 @@ import streamlit as st
 from sidebar import render_sidebar
 import pandas as pd
 import os
-from PIL import Image
-import base64
-import re
 import numpy as np
 import py3Dmol
 import streamlit.components.v1 as components
-import io
-import zipfile
-import mimetypes
 
 from utils.session_tracker import track_session
+from utils.dataset import get_dataset
+from utils.facets import get_facet_index
+from utils.sequence_index import get_sequence_index, parse_query
+from utils.range_index import get_range_index
+from utils.filter_pipeline import get_stage_cache
+from utils.selection import get_selection
+from utils.fasta_release import get_fasta_release, fasta_text, FULL_FASTA, FULL_FASTA_GZ, CHECKSUMS
+from utils.assets import get_asset_manifest
+from utils.structure_store import get_structure_store
+from utils.confidence import get_confidence_store, get_confidence_index, MEAN_PLDDT_COLS
+from utils.static_assets import static_url
+from utils.thumbnails import thumbnail_html
+from utils.downloads import lazy_artifact, build_excel, build_structure_zip
+from utils import bitmap
 track_session()
 
 
@@ -68,10 +76,7 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-def show_structure_cif(cif_path, width=350, height=250):
-    # load the CIF text
-    with open(cif_path, 'r') as f:
-        cif_data = f.read()
+def show_structure_cif(cif_data, width=350, height=250):
     # set up the viewer
     view = py3Dmol.view(width=width, height=height)
     view.addModel(cif_data, 'cif')
@@ -91,11 +96,7 @@ def show_structure_cif(cif_path, width=350, height=250):
     components.html(html, height=height)
 
 
-def show_structure_pdb(pdb_path, width=350, height=250):
-    # Load the PDB file
-    with open(pdb_path, 'r') as f:
-        pdb_data = f.read()
-    
+def show_structure_pdb(pdb_data, width=350, height=250):
     # Set up the 3Dmol viewer
     view = py3Dmol.view(width=width, height=height)
     view.addModel(pdb_data, 'pdb')  # specify it's a PDB model
@@ -116,14 +117,11 @@ def show_structure_pdb(pdb_path, width=350, height=250):
     html = view._make_html()
     components.html(html, height=height)
 
-def img_html(path):
-    """Return a base64 <img> tag filling 100% width of its container."""   
+def img_html(path, sha256=None):
+    """Return a thumbnail <img> filling 100% width of its ~350 px column."""   
     if not os.path.exists(path):
         return "<div style='color:#999; padding:20px;'>No image found</div>"
-    ext = os.path.splitext(path)[1].lower().replace(".", "")
-    mime = f"image/{'jpeg' if ext in ('jpg','jpeg') else ext}"
-    data = base64.b64encode(open(path, "rb").read()).decode()
-    return f"<img src='data:{mime};base64,{data}' style='width:100%; height:auto;'/>"
+    return thumbnail_html(path, display_width=350, style="width:100%; height:auto;", sha256=sha256)
 
 # Helper to blank out NaNs if there is no value in the cell of the column of excel file
 def disp(val):
@@ -132,9 +130,29 @@ def disp(val):
         return ""
     return val
 
-def display_peptide_details(row: pd.Series):
+def highlight_sequence(seq, spans):
+    """Wrap the (start, end) stretches of a sequence matched by the search in a highlight."""
+    parts, last = [], 0
+    for start, end in spans:
+        parts.append(seq[last:start])
+        parts.append(f"<span style='background-color:#ffcc00; color:#29004c;'>{seq[start:end]}</span>")
+        last = end
+    parts.append(seq[last:])
+    return "".join(parts)
+
+def plddt_caption(summary, kind):
+    """Mean / minimum pLDDT line shown under a structure viewer."""
+    if pd.isna(summary[f"{kind}_mean"]):
+        return ""
+    return (
+        f"<div style='text-align:center;color:#6a51a3;'>"
+        f"Mean pLDDT {summary[f'{kind}_mean']:.1f} · min {summary[f'{kind}_min']:.1f}</div>"
+    )
+
+def display_peptide_details(row: pd.Series, assets, structures, confidence):
     active_seq = row["Active Sequence"]
     cNPDB_id    = int(row["cNPDB ID"])
+    plddt_summary = confidence.summary(cNPDB_id)
 
 # Prepare all content as HTML strings first
     # 1) Metadata table
@@ -225,38 +243,29 @@ def display_peptide_details(row: pd.Series):
     """
      # — Prepare MSI HTML blocks —
     msi_blocks = []
-    for tissue_col, asset_folder in [
-        ("MSI Tissue 1", "Assets/MSImaging"),
-        ("MSI Tissue 2", "Assets/MSImaging"),
-        ("MSI Tissue 3", "Assets/MSImaging"),
-    ]:
+    for n, tissue_col in enumerate(["MSI Tissue 1", "MSI Tissue 2", "MSI Tissue 3"], start=1):
         tissue = disp(row.get(tissue_col))
         if not tissue:
             continue  # Skip if tissue info is missing
     
-        suffix = " " + tissue_col.split()[-1]
-        jpeg_path = f"{asset_folder}/MSI cNP{cNPDB_id}{suffix}.jpeg"
-    
-        if not os.path.exists(jpeg_path):
+        suffix = f" {n}"
+        msi_image = assets.msi(cNPDB_id, n)
+        if msi_image is None:
             continue  # Skip if image not found
-            
-        # Encode image as base64 for download
-        with open(jpeg_path, "rb") as f:
-            img_bytes = f.read()
-            img_base64 = base64.b64encode(img_bytes).decode()
-            mime = mimetypes.guess_type(jpeg_path)[0] or "image/jpeg"
+        jpeg_path = msi_image["path"]
+        jpeg_url = static_url(jpeg_path, msi_image["sha256"])
     
-        # Create block with image preview + downloadable base64 link
+        # Create block with image preview + download link
         block = f"""
         <div style="color:#6a51a3; font-size:16px; font-weight:bold; text-align:center; margin-bottom:5px;">
           Mass Spectrometry Imaging – {tissue}
         </div>
         <div style="border:2px dashed #6a51a3; padding:10px; margin-bottom:10px; text-align:center;">
-          {img_html(jpeg_path)}
+          {img_html(jpeg_path, msi_image['sha256'])}
         </div>
         <div style="text-align:center; margin-bottom:30px;">
           <a download="MSI cNP{cNPDB_id}{suffix}.jpeg"
-             href="data:{mime};base64,{img_base64}"
+             href="{jpeg_url}"
              style="
                display:inline-block;
                padding:10px 20px;
@@ -297,24 +306,18 @@ def display_peptide_details(row: pd.Series):
           unsafe_allow_html=True
         )
 
-        if cNPDB_id <= 1000:
-            folder = "Assets/3D Structure AlphaFold 1_1000"
-        else:
-            folder = "Assets/3D Structure AlphaFold 1001_2000"
-        
-        cif_file = os.path.join(folder, f"3D cNP {cNPDB_id}.cif")
-        if os.path.exists(cif_file):
-            show_structure_cif(cif_file, width=350, height=250)
+        alphafold = assets.alphafold(cNPDB_id)
+        if alphafold is not None:
+            cif_file = alphafold["path"]
+            show_structure_cif(structures.text(cNPDB_id, 'alphafold'), width=350, height=250)
+            st.markdown(plddt_caption(plddt_summary, 'alphafold'), unsafe_allow_html=True)
             # Add download button right below 3D view
-            with open(cif_file, "rb") as f:
-                cif_bytes = f.read()
-                cif_base64 = base64.b64encode(cif_bytes).decode()
 
             st.markdown(
                 f"""
                 <div style="text-align:center; margin-top:15px;">
                   <a download="3D_cNP {cNPDB_id}.cif"
-                     href="data:chemical/x-cif;base64,{cif_base64}"
+                     href="{static_url(cif_file, alphafold['sha256'])}"
                      style="
                        display:inline-block;
                        padding:10px 20px;
@@ -335,32 +338,25 @@ def display_peptide_details(row: pd.Series):
             st.write("No AlphaFold-predicted 3D structure are available for this peptide")
 
          # Meta PDB file
-        if cNPDB_id <= 1000:
-            esm_folder = "Assets/3D Structure ESMFold 1_1000"
-        else:
-            esm_folder = "Assets/3D Structure ESMFold 1001_2000"
-        
-        meta_pdb_file = os.path.join(esm_folder, f"3D Meta cNP{cNPDB_id}.pdb")
-
-        if os.path.exists(meta_pdb_file):
+        esmfold = assets.esmfold(cNPDB_id)
+        if esmfold is not None:
+            meta_pdb_file = esmfold["path"]
             st.markdown("<div style='margin-top:10px;'></div>", unsafe_allow_html=True)
             st.markdown(
                 "<div style='text-align:center;font-weight:bold;color:#6a51a3;'>ESMFold-predicted 3D Structure</div>",
                 unsafe_allow_html=True
             )
         
-            show_structure_pdb(meta_pdb_file, width=350, height=250)
+            show_structure_pdb(structures.text(cNPDB_id, 'esmfold'), width=350, height=250)
+            st.markdown(plddt_caption(plddt_summary, 'esmfold'), unsafe_allow_html=True)
         
             # Download button for PDB
-            with open(meta_pdb_file, "rb") as f:
-                pdb_bytes = f.read()
-                pdb_base64 = base64.b64encode(pdb_bytes).decode()
         
             st.markdown(
                 f"""
                 <div style="text-align:center; margin-top:10px;">
                   <a download="3D_Meta_cNP{cNPDB_id}.pdb"
-                     href="data:chemical/x-pdb;base64,{pdb_base64}"
+                     href="{static_url(meta_pdb_file, esmfold['sha256'])}"
                      style="
                        display:inline-block;
                        padding:8px 16px;
@@ -379,6 +375,13 @@ def display_peptide_details(row: pd.Series):
             )
         else:
             st.write("No ESMFold-predicted 3D structure is available for this peptide.")
+
+        if pd.notna(plddt_summary['ca_rmsd']):
+            st.markdown(
+                f"<div style='text-align:center;color:#6a51a3;margin-top:10px;'>"
+                f"AlphaFold vs ESMFold CA RMSD: {plddt_summary['ca_rmsd']:.2f} Å</div>",
+                unsafe_allow_html=True
+            )
             
     with col_msi:
         for block in msi_blocks:
@@ -431,25 +434,63 @@ div.stCheckbox {
 """, unsafe_allow_html=True)
 
 # --- Load Data ---
-df = pd.read_excel("Assets/20250801_cNPDB.xlsx")
+# Current cNPDB release, shared by every page (see utils/dataset.py)
+dataset = get_dataset()
+df = dataset.df
+
+# Structure and MSI files of every peptide, listed once per release (see utils/assets.py)
+asset_manifest = get_asset_manifest(dataset)
+# Predicted structures packed in one memory-mapped file (see utils/structure_store.py)
+structure_store = get_structure_store(dataset)
+# Per-residue pLDDT and model summaries extracted once from those structures (see utils/confidence.py)
+confidence_store = get_confidence_store(dataset)
+
+# Each filter stage's last row bitmap in this session; only stages whose widgets changed rerun
+stages = get_stage_cache(dataset)
 
 # --- FASTA DOWNLOAD: Full Database ---
-full_fasta = "\n".join(
-    f">{str(row['ID']).lstrip('>')}\n{str(row['Sequence'])}"
-    for _, row in df.iterrows()
-    if pd.notna(row['ID']) and pd.notna(row['Sequence'])
-)
+# Written to disk once per release with its checksums (see utils/fasta_release.py)
+fasta_release = get_fasta_release(dataset)
 
 col1, col2, col3 = st.columns([1, 1, 1])
 with col2:
     st.download_button(
         label="Download Full cNPDB Database (FASTA)",
-        data=full_fasta,
-        file_name="cNPDB_Full_Database.fasta",
+        data=fasta_release.reader(FULL_FASTA),
+        file_name=FULL_FASTA,
         mime="text/plain",
         type="primary",
         key="download_full_fasta"
     )
+    with st.expander("More FASTA downloads"):
+        st.download_button(
+            label="Full database (gzip)",
+            data=fasta_release.reader(FULL_FASTA_GZ),
+            file_name=FULL_FASTA_GZ,
+            mime="application/gzip",
+            key="download_full_fasta_gz"
+        )
+        split_labels = {'OS': "Organism", 'Family': "Family"}
+        split_col = st.radio("Split by", list(split_labels), format_func=split_labels.get,
+                             horizontal=True, key="fasta_split_col")
+        split_term = st.selectbox(split_labels[split_col], list(fasta_release.splits[split_col]),
+                                  key="fasta_split_term")
+        split_name = fasta_release.splits[split_col][split_term]
+        st.download_button(
+            label=f"Download {split_term} (FASTA)",
+            data=fasta_release.reader(split_name),
+            file_name=f"cNPDB_{os.path.basename(split_name)}",
+            mime="text/plain",
+            key="download_split_fasta"
+        )
+        st.download_button(
+            label="SHA-256 checksums",
+            data=fasta_release.reader(CHECKSUMS),
+            file_name=f"cNPDB_{dataset.version}_{CHECKSUMS}",
+            mime="text/plain",
+            key="download_fasta_checksums"
+        )
+        st.caption(f"Release {dataset.version} · SHA-256 {fasta_release.checksums[FULL_FASTA]}")
 
 # --- Separator Line ---
 st.markdown("""
@@ -467,20 +508,6 @@ st.markdown(
 # Begin styled container
 st.markdown('<div class="main-search-container">', unsafe_allow_html=True)
 
-# Ensure numeric columns are numeric
-numeric_cols = ['Monoisotopic Mass', 'Length', 'GRAVY', '% Hydrophobic Residue', 'Instability Index Value', 'Isoelectric Point (pI)', 'Net Charge (pH 7.0)', 'Aliphatic Index', 'Boman Index']
-for col in numeric_cols:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-# Helper function to extract unique clean items from multi-value cells
-def extract_unique_values(series):
-    return sorted(set(
-        item.strip()
-        for entry in series.dropna()
-        for item in re.split(r'[;,]', str(entry))
-        if item.strip()
-    ))
-
 # Create two columns with a 20px gap using Streamlit's built-in layout
 col_filter, col_main = st.columns([1, 3], gap= "large")
 
@@ -518,7 +545,57 @@ with col_filter:
     st.markdown('<div class="section-title">Boman Index</div>', unsafe_allow_html=True)
     boman_index_value = st.slider("", -0.45, 2.65, (-0.45, 2.65), label_visibility="collapsed")
 
+    st.markdown('<div class="section-title">Mean pLDDT (AlphaFold)</div>', unsafe_allow_html=True)
+    plddt_range = st.slider("", 0, 100, (0, 100), label_visibility="collapsed", key="plddt_range")
+
     st.markdown('</div>', unsafe_allow_html=True)
+
+default_ranges = {
+    'Monoisotopic Mass': (200.0, 16000.0),
+    'Length': (2, 150),
+    'GRAVY': (-5.0, 5.0),
+    '% Hydrophobic Residue': (-1, 100),
+    'Instability Index Value': (-100, 250),
+    'Isoelectric Point (pI)': (0, 14),
+    'Net Charge (pH 7.0)': (-25, 10),
+    'Aliphatic Index': (0, 390),
+    'Boman Index': (-0.45, 2.65),
+}
+slider_ranges = {
+    'Monoisotopic Mass': mono_mass_range,
+    'Length': length_range,
+    'GRAVY': gravy_range,
+    '% Hydrophobic Residue': hydro_range,
+    'Instability Index Value': instability_index_value,
+    'Isoelectric Point (pI)': isoelectric_point_value,
+    'Net Charge (pH 7.0)': net_charge_value,
+    'Aliphatic Index': aliphatic_index_value,
+    'Boman Index': boman_index_value,
+}
+sliders_moved = any(slider_ranges[col] != default_ranges[col] for col in default_ranges)
+# Two binary searches per moved slider on the per-release sorted columns
+slider_bits = stages.get(
+    "sliders", tuple(slider_ranges.values()),
+    lambda: get_range_index(dataset).filter(slider_ranges, default_ranges),
+)
+# Structure confidence only filters once moved, so peptides without a model stay listed by default
+plddt_moved = plddt_range != (0, 100)
+plddt_bits = stages.get(
+    "plddt", plddt_range,
+    lambda: get_confidence_index(dataset).between(MEAN_PLDDT_COLS['alphafold'], *plddt_range),
+)
+
+# Multiselect widget key of each facet column, used to read the other facets' selections
+facet_keys = {
+    'Family': "fam",
+    'OS': "org",
+    'Tissue': "tissue",
+    'PTM': "ptm",
+    'Existence': "exist",
+    'Topic': "topic",
+    'Instrument': "instrument",
+    'Technique': "technique",
+}
         
 # Main column (3/4 width)
 with col_main:
@@ -536,162 +613,122 @@ with col_main:
         placeholder="Separate by space, No PTMs included e.g., FDAFTTGFGHN ARPRNFLRF"
     )
 
+    # Exact-substring lookup on the per-release suffix array; input is never run as a regex
+    peptides = parse_query(peptide_input)
+    sequence_bits = stages.get(
+        "sequence", tuple(peptides),
+        lambda: get_sequence_index(dataset).search(peptides) if peptides else bitmap.full(len(df)),
+    )
+
     st.markdown("</div>", unsafe_allow_html=True)
 
+    # Precomputed per release: option lists and term -> row bitmaps of every facet
+    facet_index = get_facet_index(dataset)
+
+    def facet_bits(col, selected):
+        return stages.get(f"facet:{col}", tuple(selected), lambda: facet_index.match(col, selected))
+
+    def all_facets_bits(selections):
+        """Rows matching every active facet: OR within a column, AND across columns."""
+        return bitmap.intersect(
+            [facet_bits(col, selected) for col, selected in selections.items() if selected], len(df)
+        )
+
+    # Rows still allowed by the sequence search and by sliders moved off their defaults,
+    # so each option can show how many peptides it matches within the current search
+    count_context = np.bitwise_and(sequence_bits, slider_bits) if sliders_moved else sequence_bits
+    if plddt_moved:
+        count_context = np.bitwise_and(count_context, plddt_bits)
+
+    def facet_multiselect(col, key):
+        other_selections = {c: st.session_state.get(k, []) for c, k in facet_keys.items() if c != col}
+        counts_inputs = (
+            tuple(tuple(selected) for selected in other_selections.values()),
+            tuple(peptides),
+            tuple(slider_ranges.values()) if sliders_moved else None,
+            plddt_range,
+        )
+        counts = stages.get(
+            f"counts:{col}", counts_inputs,
+            lambda: facet_index.counts(col, np.bitwise_and(count_context, all_facets_bits(other_selections))),
+        )
+        return st.multiselect(
+            label=" ",
+            options=facet_index.vocabularies[col],
+            key=key,
+            label_visibility="collapsed",
+            format_func=lambda term: f"{term} ({counts[term]})",
+        )
+
     # Family
     st.markdown('<div class="section-title" style="margin-top: -10px; margin-bottom: 8px;">Family</div>', unsafe_allow_html=True)
-    family_opts = sorted(df['Family'].dropna().unique())
-    family_selected = st.multiselect(label=" ", options=family_opts, key="fam", label_visibility="collapsed")
+    family_selected = facet_multiselect('Family', "fam")
 
     # Organisms
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Organisms</div>', unsafe_allow_html=True)
-    org_opts = extract_unique_values(df['OS'])
-    organisms_selected = st.multiselect(label=" ", options=org_opts, key="org", label_visibility="collapsed")
+    organisms_selected = facet_multiselect('OS', "org")
 
     # Tissue
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Tissue</div>', unsafe_allow_html=True)
-    tissue_opts = extract_unique_values(df['Tissue'])
-    tissue_selected = st.multiselect(label=" ", options=tissue_opts, key="tissue", label_visibility="collapsed")
+    tissue_selected = facet_multiselect('Tissue', "tissue")
 
     # PTM
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Post-translational modifications (PTM)</div>', unsafe_allow_html=True)
-    ptm_opts = extract_unique_values(df['PTM'])
-    ptm_selected = st.multiselect(label=" ", options=ptm_opts, key="ptm", label_visibility="collapsed")
+    ptm_selected = facet_multiselect('PTM', "ptm")
 
     # Existence
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Existence</div>', unsafe_allow_html=True)
-    exist_opts      = extract_unique_values(df['Existence'])
-    existence_selected = st.multiselect(label=" ", options=exist_opts, key="exist", label_visibility="collapsed")
+    existence_selected = facet_multiselect('Existence', "exist")
 
      # --- NEW: Filters for Sheet 2 data ---
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Physiological Studies or Applications</div>', unsafe_allow_html=True)
-    topic_opts = extract_unique_values(df['Topic'])
-    topic_selected = st.multiselect(label=" ", options=topic_opts, key="topic", label_visibility="collapsed")
+    topic_selected = facet_multiselect('Topic', "topic")
 
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Instrument</div>', unsafe_allow_html=True)
-    instrument_opts = extract_unique_values(df['Instrument'])
-    instrument_selected = st.multiselect(label=" ", options=instrument_opts, key="instrument", label_visibility="collapsed")
+    instrument_selected = facet_multiselect('Instrument', "instrument")
     
     st.markdown('<div class="section-title" style="margin-top: 15px; margin-bottom: 8px">Technique</div>', unsafe_allow_html=True)
-    technique_opts = extract_unique_values(df['Technique'])
-    technique_selected = st.multiselect(label=" ", options=technique_opts, key="technique", label_visibility="collapsed")
+    technique_selected = facet_multiselect('Technique', "technique")
 
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Close outer flex div
 st.markdown('</div>', unsafe_allow_html=True)
 
-def match_multivalue_column(selected_list, cell_value):
-    """
-    Check if any selected item is found in the split values of a cell (handles ; or , and trims spaces).
-    """
-    if pd.isna(cell_value):
-        return False
-    split_values = [entry.strip() for entry in re.split(r'[;,]', str(cell_value))]
-    return any(sel.strip() in split_values for sel in selected_list)
-    
 # Filtering logic
-df_filtered = df.copy()
-
-# 1) Always apply peptide sequence search if provided
-if peptide_input:
-    peptides = peptide_input.split()
-    # Create a regex pattern joining peptides with '|', meaning OR in regex
-    pattern = '|'.join(peptides)
-    df_filtered = df_filtered[df_filtered['Sequence'].str.contains(pattern, na=False)]
-
+# 1) Always apply peptide sequence search if provided (sequence_bits above)
 # 2) Apply right-side filters (multiselects) if any are selected
-# These are "primary" filters - when used, they must be matched
-right_filters_active = False
-
-# Family filter
-if family_selected:
-    df_filtered = df_filtered[df_filtered['Family'].isin(family_selected)]
-    right_filters_active = True
-
-# Existence filter
-if existence_selected:
-    df_filtered = df_filtered[df_filtered['Existence'].isin(existence_selected)]
-    right_filters_active = True
-    
-# --- MULTI-VALUE FILTERS ---
-if tissue_selected:
-    df_filtered = df_filtered[df_filtered['Tissue'].apply(
-        lambda x: match_multivalue_column(tissue_selected, x)
-    )]
-    right_filters_active = True
-
-if organisms_selected:
-    df_filtered = df_filtered[df_filtered['OS'].apply(
-        lambda x: match_multivalue_column(organisms_selected, x)
-    )]
-    right_filters_active = True
-
-if ptm_selected:
-    df_filtered = df_filtered[df_filtered['PTM'].apply(
-        lambda x: match_multivalue_column(ptm_selected, x)
-    )]
-    right_filters_active = True
-
-if topic_selected:
-    df_filtered = df_filtered[df_filtered['Topic'].apply(
-        lambda x: match_multivalue_column(topic_selected, x)
-    )]
-    right_filters_active = True
-
-if instrument_selected:
-    df_filtered = df_filtered[df_filtered['Instrument'].apply(
-        lambda x: match_multivalue_column(instrument_selected, x)
-    )]
-    right_filters_active = True
-
-if technique_selected:
-    df_filtered = df_filtered[df_filtered['Technique'].apply(
-        lambda x: match_multivalue_column(technique_selected, x)
-    )]
-    right_filters_active = True
+# These are "primary" filters - when used, they must be matched.
+# Resolved on the precomputed term -> row bitmap index, reusing unchanged columns' bitmaps.
+facet_selections = {
+    'Family': family_selected,
+    'Existence': existence_selected,
+    'Tissue': tissue_selected,
+    'OS': organisms_selected,
+    'PTM': ptm_selected,
+    'Topic': topic_selected,
+    'Instrument': instrument_selected,
+    'Technique': technique_selected,
+}
+right_filters_active = any(facet_selections.values())
+
+final_bits = sequence_bits
+if right_filters_active:
+    final_bits = np.bitwise_and(final_bits, all_facets_bits(facet_selections))
 
 # 3) Apply left-side sliders ONLY if:
 #    - They're not at their default values, OR
 #    - No right-side filters are active
-default_ranges = {
-    'Monoisotopic Mass': (200.0, 16000.0),
-    'Length': (2, 150),
-    'GRAVY': (-5.0, 5.0),
-    '% Hydrophobic Residue': (-1, 100),
-    'Instability Index Value': (-100, 250),
-    'Isoelectric Point (pI)': (0, 14),
-    'Net Charge (pH 7.0)': (-25, 10),
-    'Aliphatic Index': (0, 390),
-    'Boman Index': (-0.45, 2.65),
-}
-
-# Only apply left slider filters if they differ from defaults OR no right filters are active
-apply_slider_filters = (
-    (mono_mass_range != default_ranges['Monoisotopic Mass']) or
-    (length_range != default_ranges['Length']) or
-    (gravy_range != default_ranges['GRAVY']) or
-    (hydro_range != default_ranges['% Hydrophobic Residue']) or
-    (instability_index_value != default_ranges['Instability Index Value']) or
-    (isoelectric_point_value != default_ranges['Isoelectric Point (pI)']) or
-    (net_charge_value != default_ranges['Net Charge (pH 7.0)']) or
-    (aliphatic_index_value != default_ranges['Aliphatic Index']) or
-    (boman_index_value != default_ranges['Boman Index']) or
-    (not right_filters_active)
-)
+apply_slider_filters = sliders_moved or not right_filters_active
 
 if apply_slider_filters:
-    df_filtered = df_filtered[
-        df_filtered['Monoisotopic Mass'].between(*mono_mass_range) &
-        df_filtered['Length'].between(*length_range) &
-        df_filtered['GRAVY'].between(*gravy_range) &
-        df_filtered['% Hydrophobic Residue'].between(*hydro_range) &
-        df_filtered['Instability Index Value'].between(*instability_index_value) &
-        df_filtered['Isoelectric Point (pI)'].between(*isoelectric_point_value) &
-        df_filtered['Net Charge (pH 7.0)'].between(*net_charge_value) &
-        df_filtered['Aliphatic Index'].between(*aliphatic_index_value) &
-        df_filtered['Boman Index'].between(*boman_index_value)
-    ]
+    final_bits = np.bitwise_and(final_bits, slider_bits)
+
+# 4) Apply the structure confidence filter whenever it is moved
+if plddt_moved:
+    final_bits = np.bitwise_and(final_bits, plddt_bits)
+
+df_filtered = df.iloc[bitmap.to_indices(final_bits, len(df))]
     
 # --- Separator Line ---
 st.markdown("""
@@ -712,26 +749,78 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# 3) Header row: left = checkbox, right = hit count
+# Selected peptides are a bitset over cNPDB IDs kept in session state: only the visible
+# page of cards gets checkbox widgets, and the selection survives filter changes
+selection = get_selection()
+selection.ensure_capacity(int(df['cNPDB ID'].max()) + 1)
+result_id_bits = selection.id_bits(df_filtered['cNPDB ID'].to_numpy())
+
+def toggle_peptide(pid):
+    if st.session_state[f"check_{pid}"]:
+        selection.add(pid)
+    else:
+        selection.discard(pid)
+
+# 3) Header row: left = bulk selection actions, right = hit count
 col1, col2 = st.columns([1,1])
 with col1:
-    check_all = st.checkbox("Check/Uncheck All")
+    col_all, col_invert, col_keep, col_clear = st.columns(4)
+    with col_all:
+        st.button("Select All Results", on_click=selection.select_all, args=(result_id_bits,),
+                  help="Add every peptide matching the current search to the selection")
+    with col_invert:
+        st.button("Invert", on_click=selection.invert, args=(result_id_bits,),
+                  help="Flip the selection of every peptide matching the current search")
+    with col_keep:
+        st.button("Keep Only Results", on_click=selection.intersect, args=(result_id_bits,),
+                  help="Drop selected peptides that do not match the current search")
+    with col_clear:
+        st.button("Clear Selection", on_click=selection.clear)
 with col2:
     # align right
     st.markdown(f"<div style='text-align: right;'>Hit: {len(df_filtered)} peptides</div>", unsafe_allow_html=True)
+    n_selected_here = bitmap.count(np.bitwise_and(selection.bits, result_id_bits))
+    st.markdown(
+        f"<div style='text-align: right;'>Selected: {selection.count()} peptides ({n_selected_here} in these results)</div>",
+        unsafe_allow_html=True
+    )
 
-# 4) Peptide cards in three columns
+# 4) Peptide cards in three columns, one page at a time
+if len(df_filtered) > 0:
+    page_size = st.session_state.get("results_per_page", 30)
+    n_pages = (len(df_filtered) + page_size - 1) // page_size
+    # Filters can shrink the results below the page the user was on
+    if st.session_state.get("results_page", 1) > n_pages:
+        st.session_state.results_page = 1
+
+    col_size, col_page, col_range = st.columns([1, 1, 2])
+    with col_size:
+        st.selectbox("Peptides per page", [30, 60, 120], key="results_per_page")
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key="results_page")
+    with col_range:
+        first = (page - 1) * page_size
+        last = min(first + page_size, len(df_filtered))
+        st.markdown(
+            f"<div style='text-align: right; padding-top: 35px;'>Showing {first + 1}–{last} of {len(df_filtered)} (page {page} of {n_pages})</div>",
+            unsafe_allow_html=True
+        )
+    df_page = df_filtered.iloc[first:last]
 
-selected_indices = []
+    # Where the searched peptides occur in each displayed Active Sequence
+    if peptides:
+        highlight_spans = get_sequence_index(dataset, 'Active Sequence').match_spans(peptides, rows=df_page.index)
+    else:
+        highlight_spans = {}
 
-if len(df_filtered) > 0:
     cols = st.columns(3)
 
-    for i, (idx, row) in enumerate(df_filtered.iterrows()):
+    for i, (idx, row) in enumerate(df_page.iterrows()):
+        pid = int(row['cNPDB ID'])
         with cols[i % 3]:
-            checked = st.checkbox("", key=f"check_{idx}", value=check_all)
-            if checked:
-                selected_indices.append(idx)
+            # Sync the widget from the selection store before it is drawn
+            st.session_state[f"check_{pid}"] = selection.contains(pid)
+            st.checkbox("", key=f"check_{pid}", on_change=toggle_peptide, args=(pid,))
 
             # Clean organism field to only show unique values
             org_raw = str(row['OS']) if pd.notna(row['OS']) else ""
@@ -753,7 +842,7 @@ if len(df_filtered) > 0:
                             font-family: monospace;
                             font-size: 13px;
                         ">
-                            {row['Active Sequence']}
+                            {highlight_sequence(row['Active Sequence'], highlight_spans.get(idx, []))}
                         </div>
                         <div style='padding:5px; font-size:14px; overflow-wrap:break-word;'>
                             Family: {row['Family']}<br>
@@ -763,126 +852,84 @@ if len(df_filtered) > 0:
                 </div>
             """, unsafe_allow_html=True)
             
-    #5. Download or view results
-    
-    selected_rows = df_filtered.loc[selected_indices] if selected_indices else pd.DataFrame()
-    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-    
-    # View Details
-    with col1:
-        left_space, right_button = st.columns([1,4])
-        with right_button:
-            if "view_details" not in st.session_state:
-                st.session_state.view_details = False
-            
-            if st.button("View Details", type="primary"):
-                st.session_state.view_details = True
-    
-    # View Details
-    if st.session_state.view_details:
+else:
+    st.warning("❌ No peptides match your search criteria. Please refine your parameters.")
+
+#5. Download or view results
+
+# Whole selection, including peptides picked under earlier filters
+selected_rows = df[selection.mask(df['cNPDB ID'].to_numpy())]
+col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+
+# View Details
+with col1:
+    left_space, right_button = st.columns([1,4])
+    with right_button:
+        if "view_details" not in st.session_state:
+            st.session_state.view_details = False
+        
+        if st.button("View Details", type="primary"):
+            st.session_state.view_details = True
+
+# View Details
+if st.session_state.view_details:
+    if selected_rows.empty:
+        st.warning("⚠️ Please select at least one peptide to view details.")
+    else:
+        for _, row in selected_rows.iterrows():
+            display_peptide_details(row, asset_manifest, structure_store, confidence_store)
+            st.markdown("<hr style='border: 1px solid #6a51a3; margin: 40px 0;'>", unsafe_allow_html=True)
+
+# Downloads are generated only when their button is clicked, and shared across sessions
+# by selection and release (see utils/downloads.py)
+# Download Excel
+with col2:
+    with st.container():
         if selected_rows.empty:
-            st.warning("⚠️ Please select at least one peptide to view details.")
+            st.button("Download Search Results", type="primary", disabled=True)
+            st.warning("⚠️ Please select at least one peptide to download search results.")
         else:
-            for _, row in selected_rows.iterrows():
-                display_peptide_details(row)
-                st.markdown("<hr style='border: 1px solid #6a51a3; margin: 40px 0;'>", unsafe_allow_html=True)
-    
-    # Download Excel
-    with col2:
-        with st.container():
-            if selected_rows.empty:
-                st.button("Download Search Results", type="primary", disabled=True)
-                st.warning("⚠️ Please select at least one peptide to download search results.")
-            else:
-                excel_buf = io.BytesIO()
-                with pd.ExcelWriter(excel_buf, engine="openpyxl") as writer:
-                    selected_rows.to_excel(writer, index=False, sheet_name="Selected")
-                excel_buf.seek(0)
-                st.download_button(
-                    "Download Search Results",
-                    data=excel_buf,
-                    file_name="cNPDB_Search_Results.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    type="primary",
-                    key="download_excel"
-                )
-    
-    # --- Download FASTA File ---
-    with col3:
-        with st.container():
-            if selected_rows.empty:
-                st.button("Download FASTA File", type="primary", disabled=True)
-                st.warning("⚠️ Please select at least one peptide to download FASTA file.")
-            else:
-                fasta_str = "\n".join(
-                f">{str(row['ID']).lstrip('>')}\n{str(row['Sequence'])}"
-                for _, row in selected_rows.iterrows()
-                )
-                st.download_button(
-                    "Download FASTA File",
-                    data=fasta_str,
-                    file_name="cNPDB_Search_Result.fasta",
-                    mime="text/plain",
-                    type="primary",
-                    key="download_fasta"
-                )
-    
-    # --- Download ZIP (CIF + MSI) ---
-    with col4:
-        with st.container():
-            if selected_rows.empty:
-                st.button("Download 3D Structures + MSI", type="primary", disabled=True)
-                st.warning("⚠️ Please select at least one peptide to download 3D structure and MSI files.")
-            else:
-                zip_buf = io.BytesIO()
-                with zipfile.ZipFile(zip_buf, "w") as zipf:
-                    for _, row in selected_rows.iterrows():
-                        cnp_id = int(row["cNPDB ID"])
-
-                        # Determine AlphaFold folder
-                        if cnp_id <= 1000:
-                            alphafold_folder = "Assets/3D Structure AlphaFold 1_1000"
-                        else:
-                            alphafold_folder = "Assets/3D Structure AlphaFold 1001_2000"
-    
-                        cif_path = os.path.join(alphafold_folder, f"3D cNP {cnp_id}.cif")
-                        if os.path.exists(cif_path):
-                            zipf.write(cif_path, arcname=f"AlphaFold_3D_Structures/{os.path.basename(cif_path)}")
-    
-                        # Determine ESMFold folder
-                        if cnp_id <= 1000:
-                            esmfold_folder = "Assets/3D Structure ESMFold 1_1000"
-                        else:
-                            esmfold_folder = "Assets/3D Structure ESMFold 1001_2000"
-    
-                        pdb_path = os.path.join(esmfold_folder, f"3D Meta cNP{cnp_id}.pdb")
-                        if os.path.exists(pdb_path):
-                            zipf.write(pdb_path, arcname=f"ESMfold_3D_Structures/{os.path.basename(pdb_path)}")
+            st.download_button(
+                "Download Search Results",
+                data=lazy_artifact(dataset, selected_rows, "xlsx", build_excel),
+                file_name="cNPDB_Search_Results.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                type="primary",
+                key="download_excel"
+            )
 
-    
-                        # Add MSI images
-                        for tissue_col, asset_folder in [
-                            ("MSI Tissue 1", "Assets/MSImaging"),
-                            ("MSI Tissue 2", "Assets/MSImaging"),
-                            ("MSI Tissue 3", "Assets/MSImaging"),
-                        ]:
-                            suffix = " " + tissue_col.split()[-1]
-                            msi_path = f"{asset_folder}/MSI cNP{cnp_id}{suffix}.jpeg"
-                            if os.path.exists(msi_path):
-                                zipf.write(msi_path, arcname=f"MSI_Images/{os.path.basename(msi_path)}")
-    
-                zip_buf.seek(0)
-                st.download_button(
-                    "Download 3D Structures + MSI",
-                    data=zip_buf,
-                    file_name="cNPDB_3D_Structures_MSI.zip",
-                    mime="application/zip",
-                    type="primary",
-                    key="download_zip"
-                ) 
+# --- Download FASTA File ---
+with col3:
+    with st.container():
+        if selected_rows.empty:
+            st.button("Download FASTA File", type="primary", disabled=True)
+            st.warning("⚠️ Please select at least one peptide to download FASTA file.")
+        else:
+            st.download_button(
+                "Download FASTA File",
+                data=lazy_artifact(dataset, selected_rows, "fasta", fasta_text),
+                file_name="cNPDB_Search_Result.fasta",
+                mime="text/plain",
+                type="primary",
+                key="download_fasta"
+            )
 
-else:
-    st.warning("❌ No peptides match your search criteria. Please refine your parameters.")
+# --- Download ZIP (CIF + MSI) ---
+with col4:
+    with st.container():
+        if selected_rows.empty:
+            st.button("Download 3D Structures + MSI", type="primary", disabled=True)
+            st.warning("⚠️ Please select at least one peptide to download 3D structure and MSI files.")
+        else:
+            st.download_button(
+                "Download 3D Structures + MSI",
+                data=lazy_artifact(dataset, selected_rows, "zip",
+                                   lambda rows: build_structure_zip(rows, asset_manifest, structure_store)),
+                file_name="cNPDB_3D_Structures_MSI.zip",
+                mime="application/zip",
+                type="primary",
+                key="download_zip"
+            )
 
 # 5) Close container div
 st.markdown(
@@ -2,12 +2,20 @@ import streamlit as st
 from sidebar import render_sidebar
 from Bio.SeqUtils.ProtParam import ProteinAnalysis
 import pandas as pd
-from Bio import pairwise2
+import time
 from io import StringIO
-from Bio.Align import substitution_matrices
-import re
+from Bio import SeqIO
 
 from utils.session_tracker import track_session
+from utils.dataset import get_dataset
+from utils.downloads import build_excel
+from utils.alignment import align, score_table
+from utils.alignment_cache import alignment_key, get_alignment_cache
+from utils.alignment_pool import get_alignment_pool
+from utils.homology import (
+    BLAST_MATRICES, DEFAULT_GAP_COSTS, GAPPED_KARLIN_ALTSCHUL, MATRICES, WORD_SIZES,
+    gap_penalties, gapped_karlin_altschul, get_seed_index, search as blast_search,
+)
 track_session()
 
 
@@ -164,12 +172,12 @@ Peptide Alignment allows users to align two peptide sequences of interest or aga
 </div>
 """, unsafe_allow_html=True)
 
-# Load peptide sequence database
-@st.cache_data
-def load_data():
-    return pd.read_excel("Assets/20250801_cNPDB.xlsx")
+# Load peptide sequence database (current cNPDB release, shared by every page)
+dataset = get_dataset()
+df = dataset.df
 
-df = load_data()
+# Scoring option of the alignment settings that uses the match / mismatch inputs
+MATCH_MISMATCH = "Match/Mismatch"
 
 # Initialize default values in session_state if not set
 if "match_score" not in st.session_state:
@@ -188,6 +196,12 @@ if "target_seq" not in st.session_state:
     st.session_state.target_seq = ""
 if "use_database" not in st.session_state:
     st.session_state.use_database = False
+if "scoring" not in st.session_state:
+    st.session_state.scoring = MATCH_MISMATCH
+if "top_k" not in st.session_state:
+    st.session_state.top_k = 10
+if "batch_top_k" not in st.session_state:
+    st.session_state.batch_top_k = 1
 
 # Reset button (centered above inputs)
 col_reset_left, col_reset_mid, col_reset_right = st.columns([1.8, 1, 1])
@@ -202,6 +216,9 @@ with col_reset_mid:
         st.session_state.query_seq = ""
         st.session_state.target_seq = ""
         st.session_state.use_database = False
+        st.session_state.scoring = MATCH_MISMATCH
+        st.session_state.top_k = 10
+        st.session_state.batch_top_k = 1
 
 
 # Utility functions
@@ -221,7 +238,7 @@ def custom_format_alignment(aln):
     identity = calculate_percent_identity(seqA, seqB)
     return f"{seqA}\n{midline}\n{seqB}", identity
 
-def generate_alignment_text(query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, top_hits, df):
+def generate_alignment_text(query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, top_hits, df, matrix=None):
     report = StringIO()
     summary_data = []
 
@@ -250,7 +267,10 @@ def generate_alignment_text(query_seq, alignment_type, match_score, mismatch_sco
     report.write("="*40 + "\n")
     report.write(f"Query Sequence: {query_seq}\n")
     report.write(f"Alignment Type: {alignment_type}\n")
-    report.write(f"Match Score: {match_score}, Mismatch Penalty: {mismatch_score}\n")
+    if matrix:
+        report.write(f"Scoring Matrix: {matrix}\n")
+    else:
+        report.write(f"Match Score: {match_score}, Mismatch Penalty: {mismatch_score}\n")
     report.write(f"Gap Open: {gap_open}, Gap Extend: {gap_extend}\n\n")
 
     # Summary Table FIRST
@@ -296,18 +316,27 @@ if not st.session_state.target_seq:
 else:
     use_database = None
 
+if use_database:
+    top_k = st.number_input("Number of Top Hits", min_value=1, max_value=100, step=1, key="top_k")
+else:
+    top_k = st.session_state.top_k
+
 # Alignment parameters
 st.markdown("### Alignment Settings")
-col_param = st.columns(5)
+col_param = st.columns(6)
 with col_param[0]:
     alignment_type = st.selectbox("Type", ["global", "local"], key="alignment_type")
 with col_param[1]:
-    match_score = st.number_input("Match", key="match_score")
+    scoring = st.selectbox("Scoring", [MATCH_MISMATCH] + MATRICES, key="scoring")
+# A substitution matrix replaces the match / mismatch scores
+matrix = None if scoring == MATCH_MISMATCH else scoring
 with col_param[2]:
-    mismatch_score = st.number_input("Mismatch", key="mismatch_score")
+    match_score = st.number_input("Match", key="match_score", disabled=matrix is not None)
 with col_param[3]:
-    gap_open = st.number_input("Gap Open", key="gap_open")
+    mismatch_score = st.number_input("Mismatch", key="mismatch_score", disabled=matrix is not None)
 with col_param[4]:
+    gap_open = st.number_input("Gap Open", key="gap_open")
+with col_param[5]:
     gap_extend = st.number_input("Gap Extend", key="gap_extend")
 
 # Run Alignment Button
@@ -321,39 +350,40 @@ if run_clicked:
         st.error("\u274c Please input your peptide sequence.")
     elif not st.session_state.use_database and not st.session_state.target_seq.strip():
         st.error("\u274c Please input the second sequence or choose to align against the cNPDB database.")
+    elif gap_open > gap_extend:
+        st.error("\u274c Gap Open should be lower than or equal to Gap Extend.")
     else:
         if not use_database:
             try:
-                alignments = (
-                    pairwise2.align.globalms(query_seq, target_seq, match_score, mismatch_score, gap_open, gap_extend)
-                    if alignment_type == "global" else
-                    pairwise2.align.localms(query_seq, target_seq, match_score, mismatch_score, gap_open, gap_extend)
+                aln = align(
+                    query_seq, target_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend,
+                    table=score_table(match_score, mismatch_score, matrix),
                 )
-                formatted, identity = custom_format_alignment(alignments[0])
+                if aln is None:
+                    raise ValueError("no local alignment with a positive score")
+                formatted, identity = custom_format_alignment(aln)
                 st.success("Top alignment result:")
                 st.code(f"{formatted}\n\nPercent Identity: {identity:.2f}%")
             except Exception as e:
                 st.error(f"Alignment failed: {e}")
         else:
-            results = []
-            for i, db_seq in enumerate(df["Sequence"]):
-                try:
-                    aln = (
-                        pairwise2.align.globalms(query_seq, db_seq, match_score, mismatch_score, gap_open, gap_extend, one_alignment_only=True)
-                        if alignment_type == "global" else
-                        pairwise2.align.localms(query_seq, db_seq, match_score, mismatch_score, gap_open, gap_extend, one_alignment_only=True)
-                    )
-                    score = aln[0].score if aln else 0
-                    results.append((score, db_seq, aln[0] if aln else None))
-                except Exception:
-                    continue
-
-            top_hits = sorted(results, key=lambda x: -x[0])[:10]
-            st.success("Top 10 alignment hits from cNPDB database:")
+            def run_database_alignment():
+                # Database scanned on the shared worker pool, skipping peptides that cannot
+                # reach the top hits; only the top hits are traced back
+                return get_alignment_pool(dataset).top_hits(
+                    query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, n=int(top_k), matrix=matrix
+                )
 
+            # Hits are shared by every session (and batch run) asking the same question of this release;
+            # the report is built from them only for the query being viewed
+            key = alignment_key(
+                dataset, query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, top_k, matrix
+            )
+            hits = get_alignment_cache().get_or_compute(key, run_database_alignment)
             alignment_txt, df_summary = generate_alignment_text(
-                query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, top_hits, df
+                query_seq, alignment_type, match_score, mismatch_score, gap_open, gap_extend, hits, df, matrix
             )
+            st.success(f"Top {len(hits)} alignment hits from cNPDB database:")
 
             col_dl1, col_dl2, col_dl3 = st.columns([1.3, 1, 1])
             with col_dl2:
@@ -376,7 +406,7 @@ if run_clicked:
                 }
             )
 
-            for i, (score, db_seq, aln) in enumerate(top_hits):
+            for i, (score, db_seq, aln) in enumerate(hits):
                 match_row = df[df["Sequence"] == db_seq].iloc[0] if not df[df["Sequence"] == db_seq].empty else None
                 formatted, identity = custom_format_alignment(aln) if aln else ("No valid alignment.", 0)
 
@@ -402,6 +432,131 @@ if run_clicked:
                 else:
                     st.warning("No additional info found for this hit.")
 
+# --- Batch alignment of a multi-FASTA against the database ---
+st.markdown("### Batch Alignment against cNPDB")
+st.markdown(
+    "Upload a multi-FASTA file to align every sequence against the cNPDB database "
+    "with the alignment settings above."
+)
+
+# Upper limit of sequences per uploaded file
+MAX_BATCH_QUERIES = 5000
+BATCH_COLUMNS = ["Query ID", "Query Sequence", "Rank", "cNPDB ID", "Family", "Sequence", "Score", "Percent Identity"]
+
+
+def parse_fasta(data):
+    """(ID, cleaned sequence) of every non-empty record of an uploaded FASTA file."""
+    text = data.decode("utf-8", errors="replace")
+    return [
+        (record.id, "".join(str(record.seq).split()).upper())
+        for record in SeqIO.parse(StringIO(text), "fasta")
+        if str(record.seq).strip()
+    ]
+
+
+def batch_rows(query_id, query, hits, db_rows):
+    rows = []
+    for rank, (score, db_seq, aln) in enumerate(hits, start=1):
+        identity = custom_format_alignment(aln)[1] if aln else 0
+        match_row = db_rows.loc[db_seq] if db_seq in db_rows.index else None
+        rows.append((
+            query_id, query, rank,
+            match_row.get("cNPDB ID", "N/A") if match_row is not None else "N/A",
+            match_row.get("Family", "N/A") if match_row is not None else "N/A",
+            db_seq, score, identity,
+        ))
+    return rows
+
+
+col_batch = st.columns([3, 1])
+with col_batch[0]:
+    fasta_file = st.file_uploader("Multi-FASTA file", type=["fasta", "fa", "faa", "txt"], key="batch_fasta")
+with col_batch[1]:
+    batch_top_k = st.number_input("Hits per Query", min_value=1, max_value=100, step=1, key="batch_top_k")
+
+col_b1, col_b2, col_b3 = st.columns([1.7, 1, 1])
+with col_b2:
+    batch_clicked = st.button("Run Batch Alignment", type="primary", disabled=fasta_file is None)
+
+if batch_clicked:
+    batch_queries = parse_fasta(fasta_file.getvalue())
+    if not batch_queries:
+        st.error("\u274c No sequences found in the uploaded file.")
+    elif len(batch_queries) > MAX_BATCH_QUERIES:
+        st.error(f"\u274c Please upload at most {MAX_BATCH_QUERIES} sequences at a time.")
+    elif gap_open > gap_extend:
+        st.error("\u274c Gap Open should be lower than or equal to Gap Extend.")
+    else:
+        alignment_cache = get_alignment_cache()
+        db_rows = df.drop_duplicates("Sequence").set_index("Sequence", drop=False)
+        results = [None] * len(batch_queries)
+        keys = [
+            alignment_key(dataset, query, alignment_type, match_score, mismatch_score, gap_open, gap_extend, batch_top_k, matrix)
+            for _, query in batch_queries
+        ]
+        progress = st.progress(0.0)
+        status = st.empty()
+        table = st.empty()
+        start = time.perf_counter()
+
+        def show(done):
+            elapsed = time.perf_counter() - start
+            rate = done / elapsed if elapsed > 0 else 0.0
+            progress.progress(done / len(batch_queries))
+            status.caption(f"Aligned {done} of {len(batch_queries)} queries ({rate:.1f} queries/s)")
+            rows = [row for result in results if result is not None for row in result]
+            table.dataframe(pd.DataFrame(rows, columns=BATCH_COLUMNS), use_container_width=True, hide_index=True)
+
+        # Queries answered before (by this batch, another batch or the single-query search)
+        # come from the shared cache; the rest are aligned together on the worker pool
+        missing = []
+        for i, key in enumerate(keys):
+            cached = alignment_cache.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                results[i] = batch_rows(*batch_queries[i], cached, db_rows)
+        done = len(batch_queries) - len(missing)
+        if done:
+            show(done)
+
+        hits_stream = get_alignment_pool(dataset).batch_top_hits(
+            [batch_queries[i][1] for i in missing],
+            alignment_type, match_score, mismatch_score, gap_open, gap_extend, n=int(batch_top_k), matrix=matrix,
+        )
+        last_shown = 0.0
+        for k, hits in hits_stream:
+            i = missing[k]
+            alignment_cache.put(keys[i], hits)
+            results[i] = batch_rows(*batch_queries[i], hits, db_rows)
+            done += 1
+            # Redrawing a large table on every query would cost more than aligning it
+            if done == len(batch_queries) or time.perf_counter() - last_shown > 0.5:
+                show(done)
+                last_shown = time.perf_counter()
+        elapsed = time.perf_counter() - start
+        show(len(batch_queries))
+
+        report = pd.DataFrame([row for result in results for row in result], columns=BATCH_COLUMNS)
+        st.success(f"Aligned {len(batch_queries)} queries in {elapsed:.1f} s ({len(batch_queries) / elapsed:.1f} queries/s).")
+        col_bd1, col_bd2, col_bd3 = st.columns([1.3, 1, 1])
+        with col_bd2:
+            st.download_button(
+                label="Download Batch Results (TSV)",
+                data=report.to_csv(sep="\t", index=False),
+                file_name="cNPDB_batch_alignment.tsv",
+                mime="text/tab-separated-values",
+                on_click="ignore",
+            )
+        with col_bd3:
+            st.download_button(
+                label="Download Batch Results (Excel)",
+                data=build_excel(report, sheet_name="Batch Alignment"),
+                file_name="cNPDB_batch_alignment.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore",
+            )
+
 # --- Sequence alignment calculator ---
 # st.markdown(
     # '<h2 class="custom-title">'
@@ -560,213 +715,181 @@ if run_clicked:
             # st.error(f"❌ Alignment failed: {e}")
 
 # --- Separator Line ---
-# st.markdown("""
-# <hr style='border: none; border-top: 3px solid #6a51a3;  margin-top: 10px; margin-bottom: 0px; margin-left: 30px; margin-right: 30px;'>
-# """, unsafe_allow_html=True)
+st.markdown("""
+<hr style='border: none; border-top: 3px solid #6a51a3;  margin-top: 10px; margin-bottom: 0px; margin-left: 30px; margin-right: 30px;'>
+""", unsafe_allow_html=True)
 
 # --- BLAST Search ---
-# st.markdown(
-    # '<h2 class="custom-title">'
-    # 'BLAST SEARCH'
-    # '</h2>',
-    # unsafe_allow_html=True
-# )
+st.markdown(
+    '<h2 class="custom-title">'
+    'BLAST SEARCH'
+    '</h2>',
+    unsafe_allow_html=True
+)
 
-# st.markdown("""
-# <div style='font-size:15px; padding:10px 10px;'>
-# BLAST Search allows users to compare their peptide sequence against the cNPDB database and identify similar neuropeptides. Default parameters are optimized for typical neuropeptide BLAST searches, but users can customize settings to suit their needs. See <i>Glossary</i> and <i>Tutorials</i> pages for more details.
-# </div>
-# """, unsafe_allow_html=True)
+st.markdown("""
+<div style='font-size:15px; padding:10px 10px;'>
+BLAST Search allows users to compare their peptide sequence against the cNPDB database and identify similar neuropeptides. Default parameters are optimized for typical neuropeptide BLAST searches, but users can customize settings to suit their needs. See <i>Glossary</i> and <i>Tutorials</i> pages for more details.
+</div>
+""", unsafe_allow_html=True)
 
 # --- BLAST SESSION STATE DEFAULTS ---
-# blast_defaults = {
-    # "query_input": "",
-    # "e_value_thresh": 10.0,
-    # "matrix_select": "BLOSUM80",
-    # "gap_open_blast": -10.0,
-    # "gap_extend_blast": -0.5,
-    # "word_size": 3,
-    # "top_n": 10,
-    # "seg_filter": True,
-    # "comp_bias": True
-# }
+blast_defaults = {
+    "query_input": "",
+    "e_value_thresh": 10.0,
+    "matrix_select": "BLOSUM62",
+    "gap_costs_blast": DEFAULT_GAP_COSTS["BLOSUM62"],
+    "word_size": 3,
+    "top_n": 10,
+    "seg_filter": True,
+}
 
-# for key, val in blast_defaults.items():
-    # if key not in st.session_state:
-        # st.session_state[key] = val
+for key, val in blast_defaults.items():
+    if key not in st.session_state:
+        st.session_state[key] = val
 
 # Handle Reset button first — this must happen before widgets are created!
-# col1, col2, col3 = st.columns([1.8, 1, 1])
-# with col2:
-    # reset_blast = st.button("Reset", key="reset_blast", type="primary")
-# if reset_blast:
-    # for key, val in blast_defaults.items():
-        # st.session_state[key] = val
-    # st.rerun()
-
-# @st.cache_data
-# def load_db():
-    # return pd.read_excel("Assets/20250801_cNPDB.xlsx", sheet_name="Sheet 1")
-
-# df = load_db()
+col1, col2, col3 = st.columns([1.8, 1, 1])
+with col2:
+    reset_blast = st.button("Reset", key="reset_blast", type="primary")
+if reset_blast:
+    for key, val in blast_defaults.items():
+        st.session_state[key] = val
+    st.rerun()
 
 # --- Input ---
-# query_input = st.text_area("Enter your peptide sequence (Only one sequence at a time):", key="query_input", height=69)
-
-# def parse_sequence(text):
-    # lines = text.strip().splitlines()
-    # clean = [l.strip() for l in lines if not l.startswith(">")]
-    # sequence = ''.join(clean).upper()
-    # return sequence
-
-# query_seq = parse_sequence(st.session_state.query_input)
+query_input = st.text_area("Enter your peptide sequence (Only one sequence at a time):", key="query_input", height=69)
+blast_query = clean_sequence(st.session_state.query_input)
 
 # --- Settings ---
-# st.sidebar.header("BLAST Settings")
-
-# st.markdown("### BLAST Settings")
-# col_param = st.columns(5)
-# with col_param[0]:
-    # e_value_thresh = st.number_input("E-value Threshold", key="e_value_thresh", step=0.1)
-# with col_param[1]:
-    # matrix_options = ["BLOSUM62", "BLOSUM80", "BLOSUM45", "PAM30", "PAM70"]
-    # st.selectbox("Matrix", matrix_options, key="matrix_select")
-# with col_param[2]:
-    # gap_open = st.number_input("Gap Open", key="gap_open_blast", step=0.5)
-# with col_param[3]:
-    # gap_extend = st.number_input("Gap Extend", key="gap_extend_blast", step=0.1)
-# with col_param[4]:
-    # word_size = st.slider("Word Size", 2, 4, key="word_size")
-
-# col_opt = st.columns(2)
-# with col_opt[0]:
-    # top_n = st.selectbox("Number of Top Hits", [5, 10, 20], key="top_n")   
-# with col_opt[1]:
-    # seg_filter = st.checkbox("SEG Filtering", key="seg_filter")
-    # comp_bias = st.checkbox("Composition-based Stats", key="comp_bias")
-
-# Load and convert substitution matrix to pairwise2-compatible format
-# mat = substitution_matrices.load(st.session_state.matrix_select)
-# scoring_matrix = { (a, b): mat[a][b] for a in mat.alphabet for b in mat.alphabet }
-
-# Format alignment manually
-# def format_alignment(aln):
-    # seqA, seqB = aln.seqA, aln.seqB
-    # midline = ''.join(['|' if a == b else ' ' for a, b in zip(seqA, seqB)])
-    # return f"{seqA}\n{midline}\n{seqB}"
+st.markdown("### BLAST Settings")
+col_param = st.columns(4)
+with col_param[0]:
+    e_value_thresh = st.number_input("E-value Threshold", key="e_value_thresh", min_value=1e-30, step=0.1, format="%g")
+with col_param[1]:
+    matrix_choice = st.selectbox("Matrix", BLAST_MATRICES, key="matrix_select")
+# E-values need gapped statistics, which exist only for the gap costs BLAST publishes
+gap_cost_options = list(GAPPED_KARLIN_ALTSCHUL[matrix_choice])
+if st.session_state.gap_costs_blast not in gap_cost_options:
+    st.session_state.gap_costs_blast = DEFAULT_GAP_COSTS[matrix_choice]
+with col_param[2]:
+    gap_costs = st.selectbox(
+        "Gap Costs", gap_cost_options, key="gap_costs_blast",
+        format_func=lambda costs: f"Existence: {costs[0]}, Extension: {costs[1]}",
+    )
+gap_open_blast, gap_extend_blast = gap_penalties(*gap_costs)
+with col_param[3]:
+    word_size = st.slider("Word Size", min(WORD_SIZES), max(WORD_SIZES), key="word_size")
+
+col_opt = st.columns(2)
+with col_opt[0]:
+    top_n = st.selectbox("Number of Top Hits", [5, 10, 20], key="top_n")
+with col_opt[1]:
+    seg_filter = st.checkbox("SEG Filtering", key="seg_filter")
+
+def format_local_alignment(aln):
+    """Aligned region only, with the query / subject residue ranges."""
+    seqA, seqB = aln.seqA[aln.start:aln.end], aln.seqB[aln.start:aln.end]
+    midline = ''.join(['|' if a == b else ' ' for a, b in zip(seqA, seqB)])
+    query_start = len(aln.seqA[:aln.start].replace("-", "")) + 1
+    subject_start = len(aln.seqB[:aln.start].replace("-", "")) + 1
+    query_end = query_start + len(seqA.replace("-", "")) - 1
+    subject_end = subject_start + len(seqB.replace("-", "")) - 1
+    identity = sum(a == b for a, b in zip(seqA, seqB))
+    identity_pct = (identity / len(seqA)) * 100 if seqA else 0
+    text = (
+        f"Query   {query_start:<4} {seqA} {query_end}\n"
+        f"             {midline}\n"
+        f"Subject {subject_start:<4} {seqB} {subject_end}"
+    )
+    return text, identity_pct, len(seqA)
 
 # --- Generate report text ---
-# def generate_blast_text(query_seq, e_value_thresh, matrix_choice, gap_open, gap_extend, word_size, results, df):
-    # report = StringIO()
-    # report.write("cNPDB BLAST Report\n")
-    # report.write("="*40 + "\n")
-    # report.write(f"Query Sequence:\n{query_seq}\n\n")
-    # report.write("Settings:\n")
-    # report.write(f"E-value Threshold: {e_value_thresh}\n")
-    # report.write(f"Matrix: {matrix_choice}\n")
-    # report.write(f"Gap Open Penalty: {gap_open}\n")
-    # report.write(f"Gap Extend Penalty: {gap_extend}\n")
-    # report.write(f"Word Size: {word_size}\n\n")
-    
-    # for i, (score, e_val, db_seq, aln) in enumerate(results):
-        # report.write(f"Hit #{i+1} - Score: {score:.2f} | E-value: {e_val:.2e}\n")
-        # if aln:
-            # seqA, seqB = aln.seqA, aln.seqB
-            # midline = ''.join(['|' if a == b else ' ' for a, b in zip(seqA, seqB)])
-            # identity = sum(a == b for a, b in zip(seqA, seqB))
-            # aln_len = len(seqA)
-            # identity_pct = (identity / aln_len) * 100 if aln_len > 0 else 0
-            # report.write(f"{seqA}\n{midline}\n{seqB}\n")
-            # report.write(f"Identity: {identity_pct:.1f}% | Alignment Length: {aln_len}\n")
-        # else:
-            # report.write("No valid alignment available.\n")
+def generate_blast_text(query_seq, e_value_thresh, matrix_choice, gap_open, gap_extend, word_size, hits, df, seed_index):
+    params = gapped_karlin_altschul(matrix_choice, gap_open, gap_extend)
+    report = StringIO()
+    report.write("cNPDB BLAST Report\n")
+    report.write("="*40 + "\n")
+    report.write(f"Query Sequence:\n{query_seq}\n\n")
+    report.write("Settings:\n")
+    report.write(f"E-value Threshold: {e_value_thresh}\n")
+    report.write(f"Matrix: {matrix_choice}\n")
+    report.write(f"Gap Open Penalty: {gap_open}\n")
+    report.write(f"Gap Extend Penalty: {gap_extend}\n")
+    report.write(f"Word Size: {word_size}\n")
+    report.write(f"Database: {len(df)} sequences, {seed_index.total_length} residues\n")
+    report.write(f"Karlin-Altschul: lambda={params.lam:.4f}, K={params.K:.4f}, H={params.H:.4f}\n\n")
+
+    for i, hit in enumerate(hits):
+        report.write(f"Hit #{i+1} - Score: {hit.score:.2f} | Bits: {hit.bits:.1f} | E-value: {hit.evalue:.2e}\n")
+        if hit.alignment:
+            text, identity_pct, aln_len = format_local_alignment(hit.alignment)
+            report.write(text + "\n")
+            report.write(f"Identity: {identity_pct:.1f}% | Alignment Length: {aln_len}\n")
+        else:
+            report.write("No valid alignment available.\n")
 
-        # row = df[df["Sequence"] == db_seq]
-        # if not row.empty:
-            # row = row.iloc[0]
-            # report.write(f"Family: {row.get('Family', 'N/A')}\n")
-            # report.write(f"Organism: {row.get('OS', 'N/A')}\n")
-            # report.write(f"Tissue: {row.get('Tissue', 'N/A')}\n")
-            # report.write(f"Active Sequence: {row.get('Active Sequence', 'N/A')}\n")
-        # report.write("\n")
+        row = df.iloc[hit.row]
+        report.write(f"Family: {row.get('Family', 'N/A')}\n")
+        report.write(f"Organism: {row.get('OS', 'N/A')}\n")
+        report.write(f"Tissue: {row.get('Tissue', 'N/A')}\n")
+        report.write(f"Active Sequence: {row.get('Active Sequence', 'N/A')}\n")
+        report.write("\n")
 
-   # return report.getvalue()
+    return report.getvalue()
 
-# col1, col2, col3 = st.columns([1.6, 1, 1])
-# with col2:
-    # run = st.button("Run BLAST", type="primary")
+col1, col2, col3 = st.columns([1.6, 1, 1])
+with col2:
+    run = st.button("Run BLAST", type="primary")
 
 # Run BLAST
-# if run:
-    # seq_for_search = query_seq
-    # if st.session_state.seg_filter:
-        # seq_for_search = re.sub(r'[^A-Z]', '', seq_for_search)
-        # seq_for_search = re.sub(r'(.)\1{3,}', '', seq_for_search)
-
-    # results = []
-    # for i, db_seq in enumerate(df["Sequence"]):
-        # db_seq_clean = db_seq
-        # if st.session_state.seg_filter:
-            # db_seq_clean = re.sub(r'[^A-Z]', '', db_seq_clean)
-            # db_seq_clean = re.sub(r'(.)\1{3,}', '', db_seq_clean)
-
-        # if len(seq_for_search) < st.session_state.word_size or len(db_seq_clean) < st.session_state.word_size:
-            # continue
+if run:
+    if not blast_query:
+        st.error("❌ Please input your peptide sequence.")
+    elif len(blast_query) < word_size:
+        st.error(f"❌ The sequence must be at least as long as the word size ({word_size}).")
+    else:
+        # Seeded search: only sequences sharing a high-scoring word with the query are aligned
+        seed_index = get_seed_index(dataset, word_size)
+        hits = blast_search(
+            blast_query, seed_index, matrix_choice, gap_open_blast, gap_extend_blast,
+            e_value_thresh, top_n=top_n, seg_filter=seg_filter,
+        )
+
+        if not hits:
+            st.warning(f"No hits found with E-value ≤ {e_value_thresh}.")
+        else:
+            st.success(f"{len(hits)} hit(s) found with E-value ≤ {e_value_thresh}")
 
-        # try:
-            # aln = pairwise2.align.localds(seq_for_search, db_seq_clean, scoring_matrix, st.session_state.gap_open, st.session_state.gap_extend, one_alignment_only=True)
-            # score = aln[0].score if aln else 0
-            # e_val = 1e-5 * (100 - score / len(seq_for_search)) * (i + 1)
-            # if st.session_state.comp_bias:
-                # bias_penalty = abs(len(seq_for_search) - len(db_seq_clean)) * 0.01
-                # e_val += bias_penalty
-
-            # if e_val <= st.session_state.e_value_thresh:
-                # results.append((score, e_val, db_seq, aln[0] if aln else None))
-        # except Exception:
-            # continue
-
-    # results = sorted(results, key=lambda x: -x[0])[:st.session_state.top_n]
-
-    # if not results:
-        # st.warning(f"No hits found with E-value ≤ {st.session_state.e_value_thresh}.")
-    # else:
-        # st.success(f"{len(results)} hit(s) found with E-value ≤ {st.session_state.e_value_thresh}")
-
-        # blast_txt = generate_blast_text(query_seq, st.session_state.e_value_thresh,
-                                        # st.session_state.matrix_select, st.session_state.gap_open,
-                                        # st.session_state.gap_extend, st.session_state.word_size, results, df)
-
-        # col_dl1, col_dl2, col_dl3 = st.columns([1.35, 1, 1])
-        # with col_dl2:
-            # st.download_button(
-                # label="Download BLAST Results",
-                # data=blast_txt,
-                # file_name="cNPDB_BLAST_results.txt",
-                # mime="text/plain"
-            # )
+            blast_txt = generate_blast_text(blast_query, e_value_thresh, matrix_choice, gap_open_blast,
+                                            gap_extend_blast, word_size, hits, df, seed_index)
 
-        # for i, (score, e_val, db_seq, aln) in enumerate(results):
-            # st.subheader(f"Hit #{i+1}")
-            # if aln:
-                # identical = sum(a == b for a, b in zip(aln.seqA, aln.seqB))
-                # aln_length = len(aln.seqA)
-                # identity_pct = (identical / aln_length) * 100 if aln_length > 0 else 0
-                # st.text(f"Score: {score:.2f} | E-value: {e_val:.2e} | Identity: {identity_pct:.1f}% | Length: {aln_length}")
-                # st.code(format_alignment(aln))
-            # else:
-                # st.text(f"Score: {score:.2f} | E-value: {e_val:.2e}")
-                # st.warning("No alignment available")
+            col_dl1, col_dl2, col_dl3 = st.columns([1.35, 1, 1])
+            with col_dl2:
+                st.download_button(
+                    label="Download BLAST Results",
+                    data=blast_txt,
+                    file_name="cNPDB_BLAST_results.txt",
+                    mime="text/plain"
+                )
 
-            # row = df[df["Sequence"] == db_seq]
-            # if not row.empty:
-                # row = row.iloc[0]
-                # st.markdown(f"""
-                    # **Family**: {row.get('Family', 'N/A')}  
-                    # **Organism**: {row.get('OS', 'N/A')}  
-                    # **Tissue**: {row.get('Tissue', 'N/A')}  
-                    # **Active Sequence**: {row.get('Active Sequence', 'N/A')}
-                # """)
+            for i, hit in enumerate(hits):
+                st.subheader(f"Hit #{i+1}")
+                if hit.alignment:
+                    text, identity_pct, aln_length = format_local_alignment(hit.alignment)
+                    st.text(f"Score: {hit.score:.2f} | Bits: {hit.bits:.1f} | E-value: {hit.evalue:.2e} | Identity: {identity_pct:.1f}% | Length: {aln_length}")
+                    st.code(text)
+                else:
+                    st.text(f"Score: {hit.score:.2f} | Bits: {hit.bits:.1f} | E-value: {hit.evalue:.2e}")
+                    st.warning("No alignment available")
+
+                row = df.iloc[hit.row]
+                st.markdown(f"""
+                    **Family**: {row.get('Family', 'N/A')}  
+                    **Organism**: {row.get('OS', 'N/A')}  
+                    **Tissue**: {row.get('Tissue', 'N/A')}  
+                    **Active Sequence**: {row.get('Active Sequence', 'N/A')}
+                """)
 
 st.markdown("""
 <div style="text-align: center; font-size:14px; color:#2a2541;">
@@ -1,10 +1,10 @@
 import streamlit as st
 from sidebar import render_sidebar
-import base64
 import os
 import streamlit.components.v1 as components
 
 from utils.session_tracker import track_session
+from utils.thumbnails import thumbnail_html
 track_session()
 
 st.set_page_config(
@@ -175,11 +175,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- helper to load an image as base64 ---
-def img_b64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
-
 # --- your paper data ---
 papers = [
     {
@@ -303,7 +298,10 @@ for row_index in range(num_rows):
         paper_index = row_index * num_columns + col_index
         if paper_index < len(papers):
             p = papers[paper_index]
-            b64 = img_b64(p["img"])
+            toc_html = thumbnail_html(
+                p["img"], display_height=190, alt=p["title"],
+                style="max-height:100%; width:auto; object-fit:contain; border-radius:5px;"
+            )
             with cols[col_index]:
                 st.markdown(f"""
                 <div style="
@@ -318,8 +316,7 @@ for row_index in range(num_rows):
                 ">
                   <div class="resource-item">
                     <div class="toc-container">
-                      <img src="data:image/png;base64,{b64}"
-                           style="max-height:100%; width:auto; object-fit:contain; border-radius:5px;" />
+                      {toc_html}
                     </div>
                   </div>
 
@@ -1,9 +1,10 @@
 import streamlit as st
 from sidebar import render_sidebar
 import os
-import base64
 
 from utils.session_tracker import track_session
+from utils.static_assets import static_url
+from utils.video_posters import poster_path
 track_session()
 
 
@@ -15,6 +16,29 @@ st.set_page_config(
 
 render_sidebar()
 
+
+def video_html(video_path):
+    """
+    <video> streaming the file by URL: the browser fetches byte ranges only once
+    the video is played, showing a poster frame until then: an image next to the
+    video (same name, .jpg or .png) or the frame extracted by utils.video_posters.
+    """
+    poster = ""
+    stem = os.path.splitext(video_path)[0]
+    for candidate in (stem + ".jpg", stem + ".png", poster_path(video_path)):
+        if os.path.exists(candidate):
+            poster = f'poster="{static_url(candidate)}"'
+            break
+    return f"""
+        <div style="width: 700px; height: 400px; margin: 0 auto; display: flex; justify-content: center; align-items: center;">
+            <video width="700" height="400" controls preload="none" {poster}>
+                <source src="{static_url(video_path)}" type="video/mp4">
+                Your browser does not support the video tag.
+            </video>
+        </div>
+    """
+
+
 st.markdown("""
 <h3 style="margin-top: 10px; margin-bottom: 10px;">
 1. How to navigate cNPDB website
@@ -22,17 +46,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 video_path = os.path.join("Assets", "Statistics", "cNPDB_General_Compressed.mp4")
 if os.path.exists(video_path):
-    video_bytes = open(video_path, "rb").read()
-    video_base64 = base64.b64encode(video_bytes).decode()
-
-    st.markdown(f"""
-        <div style="width: 700px; height: 400px; margin: 0 auto; display: flex; justify-content: center; align-items: center;">
-            <video width="700" height="400" controls>
-                <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
-                Your browser does not support the video tag.
-            </video>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(video_html(video_path), unsafe_allow_html=True)
 else:
     st.error(f"Video not found at {video_path}")
 
@@ -44,17 +58,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 video_path = os.path.join("Assets", "Statistics", "cNPDB_NP Database search_Compressed.mp4")
 if os.path.exists(video_path):
-    video_bytes = open(video_path, "rb").read()
-    video_base64 = base64.b64encode(video_bytes).decode()
-
-    st.markdown(f"""
-        <div style="width: 700px; height: 400px; margin: 0 auto; display: flex; justify-content: center; align-items: center;">
-            <video width="700" height="400" controls>
-                <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
-                Your browser does not support the video tag.
-            </video>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(video_html(video_path), unsafe_allow_html=True)
 else:
     st.error(f"Video not found at {video_path}")
 
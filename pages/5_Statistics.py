@@ -2,9 +2,10 @@ import streamlit as st
 from sidebar import render_sidebar
 from PIL import Image
 import os
-import base64
 
 from utils.session_tracker import track_session
+from utils.static_assets import static_url
+from utils.thumbnails import thumbnail_html
 session_count = track_session()
 
 # Page settings
@@ -47,7 +48,7 @@ image_path = os.path.join("Assets", "Statistics", "Pie Chart Family Distribution
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -60,7 +61,7 @@ image_path = os.path.join("Assets", "Statistics", "Pie Chart Organism Distributi
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -73,7 +74,7 @@ image_path = os.path.join("Assets", "Statistics", "Pie chart Biological Applicat
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -86,7 +87,7 @@ image_path = os.path.join("Assets", "Statistics", "Pie chart Technique.png")
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -101,7 +102,7 @@ image_path = os.path.join("Assets", "Statistics", "Peptide Property Violin.png")
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 600px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=600, style="width: auto; height: 600px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -114,7 +115,7 @@ image_path = os.path.join("Assets", "Statistics", "Pie Chart Existence Distribut
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -127,7 +128,7 @@ image_path = os.path.join("Assets", "Statistics", "Amino Acid Composition.png")
 if os.path.exists(image_path):
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{base64.b64encode(open(image_path, "rb").read()).decode()}" style="width: auto; height: 400px;" />
+            <a href="{static_url(image_path)}" target="_blank">{thumbnail_html(image_path, display_height=400, style="width: auto; height: 400px;")}</a>
         </div>
     """, unsafe_allow_html=True)
 else:
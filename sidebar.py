@@ -2,11 +2,14 @@
 import streamlit as st
 from PIL import Image, ImageDraw
 import os
-import base64
-from io import BytesIO
 
-def render_sidebar():
-    st.markdown("""
+from utils.dataset import BUILD_DIR
+from utils.static_assets import static_url
+
+LOGO_PATH = os.path.join("Assets", "Img", "Website_Logo_2.png")
+
+# Sidebar stylesheet, identical on every page
+SIDEBAR_CSS = """
     <style>
         html, body, .stApp {
             height: 100% !important;
@@ -127,30 +130,45 @@ def render_sidebar():
         }
 
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+
+@st.cache_resource(show_spinner=False)
+def _logo_html(logo_path=LOGO_PATH):
+    """
+    Round 160x160 logo, drawn once per process and served by URL.
+    Returns None if the logo file is missing.
+    """
+    if not os.path.exists(logo_path):
+        return None
+    logo = Image.open(logo_path).convert("RGBA").resize((160, 160))
+    mask = Image.new("L", (160, 160), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((0, 0, 160, 160), fill=255)
+    logo.putalpha(mask)
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    round_logo_path = os.path.join(BUILD_DIR, "sidebar_logo.png")
+    logo.save(round_logo_path + ".tmp", format="PNG")
+    os.replace(round_logo_path + ".tmp", round_logo_path)
+    return f"""
+        <div class="logo-border">
+            <img src="{static_url(round_logo_path)}" class="circle-img" />
+        </div>
+    """
+
+
+def render_sidebar():
+    st.markdown(SIDEBAR_CSS, unsafe_allow_html=True)
 
     with st.sidebar:
         st.markdown('<div class="logo-container">', unsafe_allow_html=True)
-        logo_path = os.path.join("Assets", "Img", "Website_Logo_2.png")
-
-        if os.path.exists(logo_path):
-            logo = Image.open(logo_path).convert("RGBA").resize((160, 160))
-            mask = Image.new("L", (160, 160), 0)
-            draw = ImageDraw.Draw(mask)
-            draw.ellipse((0, 0, 160, 160), fill=255)
-            logo.putalpha(mask)
-
-            buffered = BytesIO()
-            logo.save(buffered, format="PNG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-            st.markdown(f"""
-                <div class="logo-border">
-                    <img src="data:image/png;base64,{img_base64}" class="circle-img" />
-                </div>
-            """, unsafe_allow_html=True)
+        logo_html = _logo_html()
+
+        if logo_html is not None:
+            st.markdown(logo_html, unsafe_allow_html=True)
         else:
-            st.error(f"Logo image not found at: {logo_path}")
+            st.error(f"Logo image not found at: {LOGO_PATH}")
             st.text(f"Working directory: {os.getcwd()}")
 
         st.markdown('</div>', unsafe_allow_html=True)
@@ -1,10 +1,10 @@
 import streamlit as st
 from PIL import Image, ImageDraw
 import os
-import base64
 from io import BytesIO
 import streamlit.components.v1 as components
 from utils.session_tracker import track_session
+from utils.thumbnails import thumbnail_html
 track_session()
 
 # Set page config
@@ -31,16 +31,12 @@ Despite their significance, crustacean neuropeptides remain underrepresented in
 
 """)
 
-# Load Home page image and convert to base64
+# Home page image, served as display-size thumbnails (see utils/thumbnails.py)
 image_path = os.path.join("Assets", "Img", "Home page.png")
 if os.path.exists(image_path):
-    with open(image_path, "rb") as img_file:
-        img_bytes = img_file.read()
-        img_b64 = base64.b64encode(img_bytes).decode()
-
     st.markdown(f"""
         <div style="margin: 0 auto; text-align: center;">
-            <img src="data:image/png;base64,{img_b64}" style="width: auto; max-height: 500px;" />
+            {thumbnail_html(image_path, display_height=500, style="width: auto; max-height: 500px;")}
         </div>
     """, unsafe_allow_html=True)
 else:
@@ -0,0 +1,87 @@
+import random
+import warnings
+
+import pytest
+
+with warnings.catch_warnings():
+    # pairwise2 is deprecated but is the reference the aligner reproduces
+    warnings.simplefilter("ignore")
+    from Bio import pairwise2
+from Bio.Align import substitution_matrices
+
+from utils.alignment import EncodedDatabase, align, check_gaps, database_scores, score_table
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+GAPS = [(-0.5, -0.1), (-1, -0.5), (-10, -0.5), (-2, -2)]
+
+
+def random_pairs(count, alphabet, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield (
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 15))),
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 15))),
+            rng.choice(GAPS),
+        )
+
+
+def rescore(aln, match_score, gap_open, gap_extend):
+    """Score of the aligned columns of an Alignment, gap runs costed affinely."""
+    score, gap_a, gap_b = 0.0, False, False
+    for a, b in zip(aln.seqA[aln.start:aln.end], aln.seqB[aln.start:aln.end]):
+        if a == "-":
+            score += gap_extend if gap_a else gap_open
+            gap_a, gap_b = True, False
+        elif b == "-":
+            score += gap_extend if gap_b else gap_open
+            gap_a, gap_b = False, True
+        else:
+            score += match_score(a, b)
+            gap_a = gap_b = False
+    return score
+
+
+@pytest.mark.parametrize("mode", ["global", "local"])
+@pytest.mark.parametrize("match, mismatch", [(2, -1), (1, 0), (5, -4)])
+def test_match_mismatch_scores_match_pairwise2(mode, match, mismatch):
+    reference = getattr(pairwise2.align, f"{mode}ms")
+    table = score_table(match, mismatch)
+    for a, b, (gap_open, gap_extend) in random_pairs(60, "ACDEFGHIKL", seed=match):
+        expected = reference(a, b, match, mismatch, gap_open, gap_extend, one_alignment_only=True)
+        expected = expected[0].score if expected else 0.0
+        # The target is batched with sequences of other lengths, as in a database scan
+        scores = database_scores(a, EncodedDatabase(["AC", b, "DEFGHIKLACDEFGHIKL"]), mode, match, mismatch, gap_open, gap_extend)
+        assert scores[1] == pytest.approx(expected)
+
+        aln = align(a, b, mode, match, mismatch, gap_open, gap_extend, table=table)
+        if aln is None:
+            assert mode == "local" and expected <= 0
+            continue
+        assert aln.score == pytest.approx(expected)
+        assert len(aln.seqA) == len(aln.seqB)
+        assert rescore(aln, lambda x, y: match if x == y else mismatch, gap_open, gap_extend) == pytest.approx(expected)
+        if mode == "global":
+            assert aln.seqA.replace("-", "") == a and aln.seqB.replace("-", "") == b
+
+
+@pytest.mark.parametrize("mode", ["global", "local"])
+@pytest.mark.parametrize("name", ["BLOSUM62", "PAM30"])
+def test_matrix_scores_match_pairwise2(mode, name):
+    matrix = substitution_matrices.load(name)
+    scores = {(a, b): matrix[a][b] for a in matrix.alphabet for b in matrix.alphabet}
+    reference = getattr(pairwise2.align, f"{mode}ds")
+    table = score_table(matrix=name)
+    for a, b, (gap_open, gap_extend) in random_pairs(60, AMINO_ACIDS, seed=len(name)):
+        expected = reference(a, b, scores, gap_open, gap_extend, one_alignment_only=True)
+        expected = expected[0].score if expected else 0.0
+        db_score = database_scores(a, EncodedDatabase([b]), mode, None, None, gap_open, gap_extend, table=table)[0]
+        assert db_score == pytest.approx(expected)
+        aln = align(a, b, mode, None, None, gap_open, gap_extend, table=table)
+        assert (aln.score if aln else 0.0) == pytest.approx(expected)
+
+
+def test_gap_open_above_gap_extend_is_rejected():
+    with pytest.raises(ValueError):
+        check_gaps(-0.1, -0.5)
+    with pytest.raises(ValueError):
+        database_scores("AC", EncodedDatabase(["AC"]), "global", 2, -1, -0.1, -0.5)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from utils import bitmap
+
+
+@pytest.fixture(params=[0, 1, 63, 64, 65, 1000])
+def n_rows(request):
+    return request.param
+
+
+def random_masks(n_rows, count=3, seed=0):
+    rng = np.random.default_rng(seed + n_rows)
+    return [rng.random(n_rows) < density for density in np.linspace(0.05, 0.95, count)]
+
+
+def test_round_trip(n_rows):
+    for mask in random_masks(n_rows):
+        bits = bitmap.from_mask(mask)
+        assert len(bits) == bitmap.n_words(n_rows)
+        np.testing.assert_array_equal(bitmap.to_mask(bits, n_rows), mask)
+        np.testing.assert_array_equal(bitmap.to_indices(bits, n_rows), np.flatnonzero(mask))
+        np.testing.assert_array_equal(bitmap.from_indices(np.flatnonzero(mask), n_rows), bits)
+
+
+def test_set_operations_match_boolean_arrays(n_rows):
+    masks = random_masks(n_rows)
+    bits = [bitmap.from_mask(mask) for mask in masks]
+    np.testing.assert_array_equal(
+        bitmap.to_mask(bitmap.union(bits, n_rows), n_rows), np.logical_or.reduce(masks, axis=0)
+    )
+    np.testing.assert_array_equal(
+        bitmap.to_mask(bitmap.intersect(bits, n_rows), n_rows), np.logical_and.reduce(masks, axis=0)
+    )
+    for mask, b in zip(masks, bits):
+        assert bitmap.count(b) == int(mask.sum())
+
+
+def test_empty_and_full(n_rows):
+    assert bitmap.count(bitmap.empty(n_rows)) == 0
+    assert bitmap.count(bitmap.full(n_rows)) == n_rows
+    assert bitmap.count(bitmap.intersect([], n_rows)) == n_rows
+    assert bitmap.count(bitmap.union([], n_rows)) == 0
@@ -0,0 +1,116 @@
+import random
+
+import numpy as np
+import pytest
+
+from utils.alignment import EncodedDatabase, database_scores, substitution_table
+from utils.homology import (
+    GAPPED_KARLIN_ALTSCHUL, SeedIndex, cutoff_score, evalue, gap_penalties, gapped_karlin_altschul,
+    karlin_altschul, search,
+)
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+@pytest.mark.parametrize("name, lam, K, H", [
+    # NCBI BLAST's ungapped values (blast_stat.c)
+    ("BLOSUM62", 0.3176, 0.134, 0.4012),
+    ("BLOSUM45", 0.2291, 0.0924, 0.2514),
+    ("PAM30", 0.3400, 0.283, 1.754),
+    ("PAM70", 0.3345, 0.229, 1.029),
+])
+def test_ungapped_parameters_match_blast(name, lam, K, H):
+    params = karlin_altschul(name)
+    assert params.lam == pytest.approx(lam, rel=1e-3)
+    assert params.K == pytest.approx(K, rel=1e-2)
+    assert params.H == pytest.approx(H, rel=1e-2)
+
+
+def test_gapped_parameters_by_gap_costs():
+    gap_open, gap_extend = gap_penalties(11, 1)
+    assert (gap_open, gap_extend) == (-12, -1)
+    assert gapped_karlin_altschul("BLOSUM62", gap_open, gap_extend) == GAPPED_KARLIN_ALTSCHUL["BLOSUM62"][(11, 1)]
+    with pytest.raises(ValueError):
+        gapped_karlin_altschul("BLOSUM62", -10, -0.5)
+    with pytest.raises(ValueError):
+        gapped_karlin_altschul("BLOSUM80", gap_open, gap_extend)
+
+
+def test_cutoff_score_inverts_evalue():
+    params = GAPPED_KARLIN_ALTSCHUL["BLOSUM62"][(11, 1)]
+    for threshold in (1e-5, 0.1, 10.0):
+        score = cutoff_score(threshold, 15, 30000, 1500, params)
+        assert evalue(score, 15, 30000, 1500, params) == pytest.approx(threshold)
+
+
+@pytest.mark.parametrize("threshold", [0, -1.0])
+def test_non_positive_evalue_threshold_is_rejected(threshold):
+    params = GAPPED_KARLIN_ALTSCHUL["BLOSUM62"][(11, 1)]
+    with pytest.raises(ValueError, match="positive"):
+        cutoff_score(threshold, 15, 30000, 1500, params)
+    index = SeedIndex(["GYSDRNYLRFAMIDE"], 3)
+    with pytest.raises(ValueError, match="positive"):
+        search("GYSDRNYLRF", index, "BLOSUM62", *gap_penalties(11, 1), threshold)
+
+
+def mutate(seq, rng, substitutions):
+    seq = list(seq)
+    for pos in rng.sample(range(len(seq)), substitutions):
+        seq[pos] = rng.choice(AMINO_ACIDS)
+    return "".join(seq)
+
+
+@pytest.fixture(scope="module")
+def database():
+    rng = random.Random(9)
+    background = ["".join(rng.choice(AMINO_ACIDS) for _ in range(rng.randint(5, 60))) for _ in range(600)]
+    queries = ["".join(rng.choice(AMINO_ACIDS) for _ in range(25)) for _ in range(5)]
+    # Each query has an exact copy, a lightly mutated copy and one with an insertion, inside flanks
+    planted = {}
+    for q, query in enumerate(queries):
+        variants = [query, mutate(query, rng, 3), query[:12] + "GG" + query[12:]]
+        for variant in variants:
+            planted.setdefault(q, []).append(len(background))
+            background.append(rng.choice(AMINO_ACIDS) * 3 + variant + rng.choice(AMINO_ACIDS) * 3)
+    return background, queries, planted
+
+
+@pytest.mark.parametrize("matrix, costs", [("BLOSUM62", (11, 1)), ("PAM30", (9, 1))])
+def test_search_hits_are_exact_and_find_planted_homologs(database, matrix, costs):
+    sequences, queries, planted = database
+    index = SeedIndex(sequences, 3)
+    gap_open, gap_extend = gap_penalties(*costs)
+    params = gapped_karlin_altschul(matrix, gap_open, gap_extend)
+    full_db = EncodedDatabase(sequences)
+    for q, query in enumerate(queries):
+        hits = search(query, index, matrix, gap_open, gap_extend, 1e-3, top_n=50, seg_filter=False)
+        full = database_scores(query, full_db, "local", None, None, gap_open, gap_extend, table=substitution_table(matrix))
+        assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+        for hit in hits:
+            # Reported scores are full Smith-Waterman scores, and E-values follow from them
+            assert hit.score == pytest.approx(full[hit.row])
+            assert hit.evalue == pytest.approx(evalue(hit.score, len(query), index.total_length, len(sequences), params))
+            assert hit.evalue <= 1e-3
+        assert set(planted[q]) <= {hit.row for hit in hits}
+        assert hits[0].row == planted[q][0]
+
+
+def test_search_recall_against_exhaustive_ranking(database):
+    sequences, queries, _ = database
+    index = SeedIndex(sequences, 3)
+    gap_open, gap_extend = gap_penalties(11, 1)
+    params = gapped_karlin_altschul("BLOSUM62", gap_open, gap_extend)
+    full_db = EncodedDatabase(sequences)
+    found = expected = 0
+    for query in queries + [seq[:20] for seq in sequences[:20]]:
+        full = database_scores(query, full_db, "local", None, None, gap_open, gap_extend, table=substitution_table("BLOSUM62"))
+        significant = {
+            int(row) for row in np.flatnonzero(full)
+            if evalue(full[row], len(query), index.total_length, len(sequences), params) <= 1e-3
+        }
+        hits = {hit.row for hit in search(query, index, "BLOSUM62", gap_open, gap_extend, 1e-3, top_n=len(sequences), seg_filter=False)}
+        # Every reported hit is significant by the exhaustive scan
+        assert hits <= significant
+        found += len(hits & significant)
+        expected += len(significant)
+    assert found >= 0.9 * expected
@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import bitmap
+from utils.sequence_index import SequenceIndex, build_suffix_array, parse_query
+
+
+@pytest.mark.parametrize("alphabet", ["A", "AB", "ACGT\n", "ACDEFGHIKLMNPQRSTVWY"])
+def test_suffix_array_matches_sorted_suffixes(alphabet):
+    rng = random.Random(len(alphabet))
+    for length in [0, 1, 2, 7, 64, 300]:
+        text = "".join(rng.choice(alphabet) for _ in range(length))
+        expected = sorted(range(length), key=lambda i: text[i:])
+        assert build_suffix_array(text).tolist() == expected
+
+
+@pytest.fixture(scope="module")
+def sequences():
+    rng = random.Random(7)
+    seqs = ["".join(rng.choice("ACDEKLR") for _ in range(rng.randint(0, 30))) for _ in range(200)]
+    seqs[3] = np.nan
+    return pd.Series(seqs)
+
+
+def test_search_matches_str_contains(sequences):
+    index = SequenceIndex(sequences)
+    rng = random.Random(11)
+    tokens = ["A", "KL", "LRA", "ACDEK", "W", "RRRRRRRR"]
+    for seq in rng.sample([seq for seq in sequences.dropna() if len(seq) >= 4], 20):
+        start = rng.randint(0, len(seq) - 4)
+        tokens.append(seq[start:start + 4])
+    for token in tokens:
+        expected = sequences.str.contains(token, regex=False, na=False).to_numpy()
+        np.testing.assert_array_equal(bitmap.to_mask(index.search([token]), len(sequences)), expected)
+    expected = sequences.str.contains("KL", regex=False, na=False) | sequences.str.contains("W", regex=False, na=False)
+    np.testing.assert_array_equal(bitmap.to_mask(index.search(["KL", "W"]), len(sequences)), expected.to_numpy())
+
+
+def test_occurrences_match_every_offset(sequences):
+    index = SequenceIndex(sequences)
+    for token in ["A", "KL", "LRA"]:
+        rows, offsets = index.occurrences(token)
+        found = sorted(zip(rows.tolist(), offsets.tolist()))
+        expected = [
+            (row, i) for row, seq in enumerate(sequences) if isinstance(seq, str)
+            for i in range(len(seq)) if seq.startswith(token, i)
+        ]
+        assert found == expected
+
+
+def test_match_spans_merge_overlaps():
+    index = SequenceIndex(["AAAA", "KLKL", "RFAMIDE"])
+    assert index.match_spans(["AA"]) == {0: [(0, 4)]}
+    assert index.match_spans(["KL", "LK"], rows=[1]) == {1: [(0, 4)]}
+    assert index.match_spans(["AMI", "F"]) == {2: [(1, 5)]}
+
+
+def test_tokens_are_literal():
+    index = SequenceIndex(["A.C", "ABC"])
+    assert parse_query(" a.c ") == ["A.C"]
+    np.testing.assert_array_equal(bitmap.to_mask(index.search(["A.C"]), 2), [True, False])
@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+import pytest
+
+from utils.alignment import EncodedDatabase, database_scores, score_bounds, score_table, top_scores
+from utils.alignment_pool import AlignmentPool
+
+SETTINGS = [(2, -1, None, -0.5, -0.1), (1, 0, None, -1, -0.5), (None, None, "BLOSUM62", -10, -0.5), (None, None, "PAM30", -2, -1)]
+
+
+@pytest.fixture(scope="module")
+def sequences():
+    rng = random.Random(3)
+    seqs = ["".join(rng.choice("ACDEFGHIKLMNPQRSTVWY") for _ in range(rng.randint(3, 60))) for _ in range(400)]
+    # Duplicates give tied scores, which must stay in database order
+    return seqs + seqs[:40]
+
+
+@pytest.fixture(scope="module")
+def queries(sequences):
+    return [sequences[0][:12], sequences[7], "GYSDRNYLRFAMIDE", "W", "AAAAAAAA"]
+
+
+def exhaustive(query, database, mode, match, mismatch, gap_open, gap_extend, table, n):
+    scores = database_scores(query, database, mode, match, mismatch, gap_open, gap_extend, table=table)
+    order = np.argsort(-scores, kind="stable")[:n]
+    return [(float(scores[i]), int(i)) for i in order]
+
+
+@pytest.mark.parametrize("mode", ["global", "local"])
+@pytest.mark.parametrize("match, mismatch, matrix, gap_open, gap_extend", SETTINGS)
+def test_bounds_hold_and_top_scores_equal_full_ranking(sequences, queries, mode, match, mismatch, matrix, gap_open, gap_extend):
+    database = EncodedDatabase(sequences)
+    table = score_table(match, mismatch, matrix)
+    for query in queries:
+        scores = database_scores(query, database, mode, match, mismatch, gap_open, gap_extend, table=table)
+        bounds = score_bounds(query, database, mode, table, gap_open, gap_extend)
+        assert (bounds >= scores - 1e-9).all()
+        for n in (1, 10, 100):
+            expected = exhaustive(query, database, mode, match, mismatch, gap_open, gap_extend, table, n)
+            assert top_scores(query, database, mode, gap_open, gap_extend, table, n) == expected
+
+
+@pytest.mark.parametrize("mode", ["global", "local"])
+def test_inline_pool_merges_chunks_like_full_ranking(sequences, queries, mode):
+    pool = AlignmentPool(sequences, workers=1, chunks_per_worker=3)
+    database = EncodedDatabase(sequences)
+    table = score_table(2, -1)
+    for query in queries:
+        expected = exhaustive(query, database, mode, 2, -1, -0.5, -0.1, table, 10)
+        assert pool.top_rows(query, mode, 2, -1, -0.5, -0.1, n=10) == expected
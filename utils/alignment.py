@@ -0,0 +1,329 @@
+import functools
+import heapq
+from collections import namedtuple
+import numpy as np
+from Bio.Align import substitution_matrices
+
+# Same fields as Bio.pairwise2 alignments, so existing formatting code keeps working
+Alignment = namedtuple("Alignment", ["seqA", "seqB", "score", "start", "end"])
+
+# Sequences are encoded as bytes; byte 0 pads shorter sequences in a batch
+PAD = 0
+NEG_INF = -1e18
+
+# Database sequences are aligned in batches of similar length: a batch holds at most
+# this many DP cells per row and its longest sequence is at most twice its shortest
+BATCH_CELLS = 1 << 18
+
+# Top-k searches first align this many sequences with the best score bounds
+PRUNE_BLOCK = 64
+
+# Scores are rounded before ranking, so equal scores summed in a different order
+# tie (and keep database order) instead of differing in the last bits
+SCORE_DECIMALS = 9
+
+
+def encode(seq):
+    return np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=64)
+def identity_table(match, mismatch):
+    """256x256 score table comparing residues by identity (pairwise2's ...ms modes)."""
+    table = np.full((256, 256), float(mismatch))
+    np.fill_diagonal(table, float(match))
+    table[PAD, :] = table[:, PAD] = NEG_INF
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def substitution_table(name):
+    """256x256 score table of a named matrix (BLOSUM62, PAM30, ...); unknown residues score as X."""
+    matrix = substitution_matrices.load(name)
+    alphabet = matrix.alphabet
+    index = np.full(256, alphabet.index("X"))
+    for k, letter in enumerate(alphabet):
+        index[ord(letter)] = k
+    table = np.asarray(matrix, dtype=float)[np.ix_(index, index)]
+    table[PAD, :] = table[:, PAD] = NEG_INF
+    table.flags.writeable = False
+    return table
+
+
+def score_table(match=None, mismatch=None, matrix=None):
+    """
+    Score table for one alignment setting: the named substitution matrix, or
+    identity scoring with match / mismatch. Tables are compiled once per process
+    and indexed directly by the residue bytes, so a DP row is one gather.
+    """
+    return substitution_table(matrix) if matrix else identity_table(float(match), float(mismatch))
+
+
+class EncodedDatabase:
+    """
+    Database sequences sorted by length and packed into padded uint8 batches,
+    built once per dataset release. Scores come back in the original order.
+    """
+
+    def __init__(self, sequences, batch_cells=BATCH_CELLS):
+        self.sequences = [str(seq) for seq in sequences]
+        lengths = np.array([len(seq) for seq in self.sequences], dtype=np.int64)
+        self.lengths = lengths
+        self._residues = encode("".join(self.sequences))
+        self._starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        # Residue counts of every sequence over the residues used in the database (score bounds)
+        self.alphabet, residue_index = np.unique(self._residues, return_inverse=True)
+        self.composition = np.zeros((len(self.sequences), len(self.alphabet)), dtype=np.int32)
+        np.add.at(self.composition, (np.repeat(np.arange(len(self.sequences)), lengths), residue_index), 1)
+
+        order = np.argsort(lengths, kind="stable")
+        self.batches = []
+        start = 0
+        while start < len(order):
+            # Grow the batch while it stays under batch_cells (lengths only increase)
+            stop = start + 1
+            while (
+                stop < len(order)
+                and lengths[order[stop]] <= 2 * max(lengths[order[start]], 8)
+                and (stop + 1 - start) * lengths[order[stop]] <= batch_cells
+            ):
+                stop += 1
+            rows = order[start:stop]
+            width = max(int(lengths[rows].max()), 1)
+            codes = np.zeros((len(rows), width), dtype=np.uint8)
+            for r, row in enumerate(rows):
+                codes[r, :lengths[row]] = encode(self.sequences[row])
+            self.batches.append((rows, codes, lengths[rows]))
+            start = stop
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def block(self, rows):
+        """Padded codes and lengths of the sequences at `rows`, for aligning an arbitrary subset."""
+        lengths = self.lengths[rows]
+        width = max(int(lengths.max()), 1)
+        columns = np.arange(width)[None, :]
+        inside = columns < lengths[:, None]
+        index = np.where(inside, self._starts[rows][:, None] + columns, 0)
+        codes = np.where(inside, self._residues[index] if len(self._residues) else PAD, PAD).astype(np.uint8)
+        return codes, lengths
+
+
+def _dp_rows(query, codes, lengths, table, local, gap_open, gap_extend, diagonals=None, band=None):
+    """
+    Affine-gap DP (Gotoh) over a batch of targets, one query residue at a time.
+    Each row is computed for every target and column at once: vertical gaps come
+    from the previous row, horizontal gaps from a running maximum along the row.
+    With `band`, cells further than `band` from each target's diagonal
+    (target position - query position) are excluded.
+    Yields (H, Hp, E, F) per row, each of shape (targets, columns + 1).
+    """
+    n, width = codes.shape
+    columns = np.arange(width + 1)
+    if local:
+        H = np.zeros((n, width + 1))
+    else:
+        H = np.empty((n, width + 1))
+        H[:, 0] = 0.0
+        H[:, 1:] = gap_open + (columns[1:] - 1) * gap_extend
+    F = np.full((n, width + 1), NEG_INF)
+    yield H, H, np.full_like(H, NEG_INF), F
+
+    for i, residue in enumerate(query, start=1):
+        boundary = 0.0 if local else gap_open + (i - 1) * gap_extend
+        diag = H[:, :-1] + table[residue][codes]
+        F = np.empty_like(H)
+        F[:, 0] = NEG_INF
+        F[:, 1:] = np.maximum(H[:, 1:] + gap_open, F_prev[:, 1:] + gap_extend) if i > 1 else H[:, 1:] + gap_open
+        Hp = np.empty_like(H)
+        Hp[:, 0] = boundary
+        Hp[:, 1:] = np.maximum(diag, F[:, 1:])
+        if local:
+            np.maximum(Hp, 0.0, out=Hp)
+        if band is not None:
+            outside = np.abs(columns[None, :] - i - diagonals[:, None]) > band
+            Hp[outside] = NEG_INF
+        # E[j] = max over k < j of Hp[k] + gap_open + (j - k - 1) * gap_extend
+        running = np.maximum.accumulate(Hp[:, :-1] - columns[:-1] * gap_extend, axis=1)
+        E = np.empty_like(H)
+        E[:, 0] = NEG_INF
+        E[:, 1:] = running + gap_open + (columns[1:] - 1) * gap_extend
+        H = np.maximum(Hp, E)
+        if band is not None:
+            H[outside] = NEG_INF
+        F_prev = F
+        yield H, Hp, E, F
+
+
+def check_gaps(gap_open, gap_extend):
+    # Same rule as pairwise2; it also lets horizontal gaps be taken from Hp alone
+    if gap_open > gap_extend:
+        raise ValueError("Gap opening penalty should be higher than gap extension penalty (or equal)")
+
+
+def _batch_scores(query, codes, lengths, table, local, gap_open, gap_extend, diagonals=None, band=None):
+    valid = np.arange(codes.shape[1] + 1)[None, :] <= lengths[:, None]
+    best = np.zeros(len(codes)) if local else None
+    H = None
+    for H, _, _, _ in _dp_rows(query, codes, lengths, table, local, gap_open, gap_extend, diagonals, band):
+        if local:
+            best = np.maximum(best, np.where(valid, H, 0.0).max(axis=1))
+    if local:
+        return best
+    return H[np.arange(len(codes)), lengths]
+
+
+def database_scores(query, database, mode, match, mismatch, gap_open, gap_extend, table=None, diagonals=None, band=None):
+    """
+    Alignment score of `query` against every database sequence, as
+    pairwise2.align.globalms / localms would report it (local scores floor at 0).
+    `diagonals` (one per database sequence) and `band` restrict each alignment
+    to a band around that diagonal.
+    """
+    check_gaps(gap_open, gap_extend)
+    table = score_table(match, mismatch) if table is None else table
+    query_codes = encode(query)
+    scores = np.zeros(len(database))
+    for rows, codes, lengths in database.batches:
+        batch_diagonals = None if diagonals is None else diagonals[rows]
+        scores[rows] = _batch_scores(
+            query_codes, codes, lengths, table, mode == "local", gap_open, gap_extend, batch_diagonals, band
+        )
+    return np.round(scores, SCORE_DECIMALS)
+
+
+
+def score_bounds(query, database, mode, table, gap_open, gap_extend):
+    """
+    Upper bound of the alignment score of the query against each database
+    sequence. An aligned pair scores at most what its query residue can get
+    against the residues present in the sequence (and likewise for its sequence
+    residue against the query), a gapped residue at most 0, and a global
+    alignment has to gap the length difference. Infinite when gaps score above 0.
+    """
+    if gap_extend > 0 or not len(database):
+        return np.full(len(database), np.inf)
+    query_residues, query_counts = np.unique(encode(query), return_counts=True)
+    pair = table[np.ix_(query_residues, database.alphabet)]
+    present = database.composition > 0
+    query_side = np.zeros(len(database))
+    for best_pair, count in zip(pair, query_counts):
+        best = np.where(present, best_pair[None, :], -np.inf).max(axis=1)
+        query_side += count * np.maximum(best, 0)
+    target_side = database.composition @ np.maximum(pair.max(axis=0, initial=-np.inf), 0)
+    bounds = np.minimum(query_side, target_side)
+    if mode == "global":
+        length_gap = np.abs(database.lengths - len(query))
+        bounds += np.where(length_gap > 0, gap_open + (length_gap - 1) * gap_extend, 0.0)
+    return bounds
+
+
+def top_scores(query, database, mode, gap_open, gap_extend, table, n):
+    """
+    Best `n` (score, index) of the database, best first, ties in database order,
+    kept in a bounded heap. The sequences with the highest score bounds are
+    aligned first to fill the heap; after that a length batch only aligns the
+    sequences whose bound can still beat the weakest kept score.
+    """
+    check_gaps(gap_open, gap_extend)
+    query_codes = encode(query)
+    local = mode == "local"
+    bounds = np.round(score_bounds(query, database, mode, table, gap_open, gap_extend), SCORE_DECIMALS)
+    # Min-heap keyed by (score, -index): the root is the weakest kept hit
+    heap = []
+
+    def push(rows, codes, lengths):
+        scores = _batch_scores(query_codes, codes, lengths, table, local, gap_open, gap_extend)
+        for score, row in zip(np.round(scores, SCORE_DECIMALS), rows):
+            item = (float(score), -int(row))
+            if len(heap) < n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    seed = np.lexsort((np.arange(len(database)), -bounds))[:max(n, PRUNE_BLOCK)]
+    push(seed, *database.block(seed))
+    done = np.zeros(len(database), dtype=bool)
+    done[seed] = True
+    for rows, codes, lengths in sorted(database.batches, key=lambda batch: -bounds[batch[0]].max()):
+        keep = ~done[rows]
+        if len(heap) == n:
+            keep &= bounds[rows] >= heap[0][0]
+        if keep.any():
+            push(rows[keep], codes[keep], lengths[keep])
+    return [(score, -neg_row) for score, neg_row in sorted(heap, reverse=True)]
+
+def align(seq_a, seq_b, mode, match, mismatch, gap_open, gap_extend, table=None):
+    """
+    One optimal alignment of two sequences with traceback, formatted like
+    pairwise2 (local alignments keep the unaligned flanks, padded with '-').
+    Returns None for a local alignment with no positive score.
+    """
+    check_gaps(gap_open, gap_extend)
+    table = score_table(match, mismatch) if table is None else table
+    local = mode == "local"
+    a, b = encode(seq_a), encode(seq_b)
+    codes = b[None, :] if len(b) else np.zeros((1, 1), dtype=np.uint8)
+    rows = list(_dp_rows(a, codes, np.array([len(b)]), table, local, gap_open, gap_extend))
+    H, Hp, E, F = (np.array([row[k][0, :len(b) + 1] for row in rows]) for k in range(4))
+
+    if local:
+        i, j = (int(k) for k in np.unravel_index(np.argmax(H), H.shape))
+        if H[i, j] <= 0:
+            return None
+    else:
+        i, j = len(a), len(b)
+    score = round(float(H[i, j]), SCORE_DECIMALS)
+    end_a, end_b = i, j
+
+    # Walk back through the four matrices; a diagonal step is preferred on ties
+    out_a, out_b = [], []
+    state = "H"
+    while True:
+        if state == "H":
+            if local and H[i, j] <= 0:
+                break
+            state = "Hp" if np.isclose(H[i, j], Hp[i, j]) else "E"
+        elif state == "Hp":
+            if local and Hp[i, j] <= 0:
+                break
+            if i == 0 or j == 0:
+                # Leading end gap of a global alignment
+                out_a.extend(reversed(seq_a[:i]))
+                out_b.extend("-" * i)
+                out_a.extend("-" * j)
+                out_b.extend(reversed(seq_b[:j]))
+                i = j = 0
+                break
+            if np.isclose(Hp[i, j], H[i - 1, j - 1] + table[a[i - 1], b[j - 1]]):
+                out_a.append(seq_a[i - 1])
+                out_b.append(seq_b[j - 1])
+                i, j = i - 1, j - 1
+                state = "H"
+            else:
+                state = "F"
+        elif state == "F":
+            out_a.append(seq_a[i - 1])
+            out_b.append("-")
+            state = "H" if np.isclose(F[i, j], H[i - 1, j] + gap_open) else "F"
+            i -= 1
+        else:
+            out_a.append("-")
+            out_b.append(seq_b[j - 1])
+            state = "Hp" if np.isclose(E[i, j], Hp[i, j - 1] + gap_open) else "E"
+            j -= 1
+
+    aligned_a, aligned_b = "".join(reversed(out_a)), "".join(reversed(out_b))
+    if not local:
+        return Alignment(aligned_a, aligned_b, score, 0, len(aligned_a))
+
+    start_a, start_b = i, j
+    prefix = max(start_a, start_b)
+    suffix = max(len(seq_a) - end_a, len(seq_b) - end_b)
+    return Alignment(
+        seq_a[:start_a].rjust(prefix, "-") + aligned_a + seq_a[end_a:].ljust(suffix, "-"),
+        seq_b[:start_b].rjust(prefix, "-") + aligned_b + seq_b[end_b:].ljust(suffix, "-"),
+        score, prefix, prefix + len(aligned_a),
+    )
@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import streamlit as st
+
+from utils.dataset import BUILD_DIR
+
+# Results spilled to disk survive restarts and are shared by every process of the app;
+# None keeps the cache in memory only
+DISK_CACHE_DIR = os.path.join(BUILD_DIR, "alignment_cache")
+
+
+def alignment_key(dataset, query, mode, match, mismatch, gap_open, gap_extend, n, matrix=None):
+    """
+    Content address of one database alignment: release version, query without
+    whitespace or case, and every parameter that changes the hits. Match and
+    mismatch are ignored when a substitution matrix replaces them.
+    """
+    params = {
+        'version': dataset.version,
+        'query': "".join(query.split()).upper(),
+        'mode': mode,
+        'scoring': matrix or [float(match), float(mismatch)],
+        'gaps': [float(gap_open), float(gap_extend)],
+        'n': int(n),
+        # What the entry holds, so entries of another shape are never read back as hits
+        'result': "hits",
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class AlignmentCache:
+    """
+    Bounded, thread-safe LRU of database alignment results, shared by every
+    session of the process. With `disk_dir`, results are also pickled there
+    and found again after the in-memory entry is evicted or the app restarts.
+    Once the directory passes `max_disk_entries` files, the least recently used
+    quarter of them is removed in one sweep.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None, max_disk_entries=4096):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Files in disk_dir, counted on the first write and recounted by each sweep;
+        # other processes writing there only make the next sweep come later
+        self._disk_count = None
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _load(self, key):
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        # mtime is the recency used for eviction; the file may be swept meanwhile
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return result
+
+    def _store(self, key, result):
+        if self.disk_dir is None:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = len(glob.glob(os.path.join(self.disk_dir, "*.pkl")))
+            elif not existed:
+                self._disk_count += 1
+            if self._disk_count > self.max_disk_entries:
+                self._disk_count = self._sweep(self.max_disk_entries * 3 // 4)
+
+    def _sweep(self, keep):
+        """Remove all but the `keep` most recently used files; returns how many are left."""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        files.sort(reverse=True)
+        for _, path in files[keep:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return min(len(files), keep)
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Cached result of `key`, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = self._load(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self._store(key, result)
+        self._remember(key, result)
+
+    def get_or_compute(self, key, compute):
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+
+@st.cache_resource(show_spinner=False)
+def get_alignment_cache():
+    return AlignmentCache(disk_dir=DISK_CACHE_DIR)
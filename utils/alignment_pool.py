@@ -0,0 +1,226 @@
+import contextlib
+import heapq
+import multiprocessing
+import os
+import sys
+import threading
+import types
+import weakref
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from utils.alignment import EncodedDatabase, align, check_gaps, score_table, top_scores
+
+# Worker processes used for database alignment; one core means running inline. Each
+# worker is a full interpreter holding the encoded database, so a few are plenty
+ALIGNMENT_WORKERS = min(os.cpu_count() or 1, 4)
+# Chunks per worker: enough to even out uneven chunks, few enough to keep IPC negligible
+CHUNKS_PER_WORKER = 2
+
+# Set in each worker process by _init_worker: [(global rows, EncodedDatabase), ...]
+_worker_chunks = None
+
+
+def _split_rows(sequences, n_chunks):
+    """Row indices dealt round-robin over the length-sorted database, so every chunk costs about the same."""
+    order = np.argsort([len(seq) for seq in sequences], kind="stable")
+    return [np.sort(order[c::n_chunks]) for c in range(n_chunks) if c < len(order)]
+
+
+def _encode_chunks(sequences, chunk_rows):
+    return [(rows, EncodedDatabase([sequences[row] for row in rows])) for rows in chunk_rows]
+
+
+def _init_worker(sequences, chunk_rows):
+    # The database is encoded once per worker, not once per task
+    global _worker_chunks
+    _worker_chunks = _encode_chunks(sequences, chunk_rows)
+
+
+def _chunk_top(chunks, chunk, query, params, n):
+    """Best `n` (score, global row) of one chunk, best first, ties in database order."""
+    rows, database = chunks[chunk]
+    mode, match, mismatch, gap_open, gap_extend, matrix = params
+    # Tasks carry the matrix name; each worker compiles its table once
+    table = score_table(match, mismatch, matrix)
+    # Chunk rows are in database order, so ties stay in database order
+    return [(score, int(rows[i])) for score, i in top_scores(query, database, mode, gap_open, gap_extend, table, n)]
+
+
+def _worker_chunk_top(chunk, query, params, n):
+    return _chunk_top(_worker_chunks, chunk, query, params, n)
+
+
+def _merge_top(heap, results, n):
+    """
+    Merge one chunk's best-first (score, row) into `heap`, a min-heap of the current
+    top n keyed by (score, -row): the root is the weakest kept hit.
+    """
+    for score, row in results:
+        item = (score, -row)
+        if len(heap) < n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+        else:
+            # Chunk results are best first, so the rest of this chunk cannot enter either
+            break
+
+
+def _ranked(heap):
+    """(score, row) of a _merge_top heap, best first."""
+    return [(score, -neg_row) for score, neg_row in sorted(heap, reverse=True)]
+
+
+@contextlib.contextmanager
+def _bare_main():
+    """
+    Streamlit runs each page as __main__, and spawned processes import __main__
+    on startup; this makes workers start as from a bare interpreter instead.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class AlignmentPool:
+    """
+    Persistent worker processes, each holding the encoded database split into
+    chunks. A query is scored chunk by chunk in parallel and the per-chunk
+    winners are merged into one bounded heap as they arrive.
+    """
+
+    def __init__(self, sequences, workers=ALIGNMENT_WORKERS, chunks_per_worker=CHUNKS_PER_WORKER):
+        self.sequences = [str(seq) for seq in sequences]
+        self.workers = max(1, workers)
+        self.chunk_rows = _split_rows(self.sequences, self.workers * chunks_per_worker)
+        if self.workers == 1:
+            self._executor = None
+            self._chunks = _encode_chunks(self.sequences, self.chunk_rows)
+        else:
+            # Sessions that find the executor broken replace it one at a time
+            self._restart_lock = threading.Lock()
+            self._start_executor()
+
+    def _start_executor(self):
+        # spawn: forking a process that runs Streamlit's threads is not safe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.sequences, self.chunk_rows),
+        )
+        self._shutdown = weakref.finalize(self, self._executor.shutdown, wait=False, cancel_futures=True)
+        # Start every worker now (one per submitted task), while the page is still
+        # being filled in; later submits find idle workers and never spawn
+        with _bare_main():
+            for _ in range(self.workers):
+                self._executor.submit(int)
+
+    def _run_tasks(self, tasks):
+        """
+        Yield (key, result) of every task ({key: _worker_chunk_top arguments}) as it
+        finishes. A worker that died (killed, out of memory) breaks the whole
+        executor, so it is replaced and the unfinished tasks are run once more.
+        """
+        remaining = dict(tasks)
+        for attempt in range(2):
+            executor = self._executor
+            futures = {}
+            try:
+                for key, args in remaining.items():
+                    futures[executor.submit(_worker_chunk_top, *args)] = key
+                for future in as_completed(futures):
+                    key = futures[future]
+                    result = future.result()
+                    del remaining[key]
+                    yield key, result
+                return
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                with self._restart_lock:
+                    # Another session may have replaced it already
+                    if self._executor is executor:
+                        self._shutdown()
+                        self._start_executor()
+            finally:
+                # An abandoned query (the page was rerun) must not keep the shared workers busy
+                for future in futures:
+                    future.cancel()
+
+    def _chunk_results(self, query, params, n):
+        if self._executor is None:
+            for chunk in range(len(self.chunk_rows)):
+                yield _chunk_top(self._chunks, chunk, query, params, n)
+            return
+        tasks = {chunk: (chunk, query, params, n) for chunk in range(len(self.chunk_rows))}
+        for _, results in self._run_tasks(tasks):
+            yield results
+
+    def top_rows(self, query, mode, match, mismatch, gap_open, gap_extend, n=10, matrix=None):
+        """
+        Best `n` (score, row) over the whole database, best first, ties in database
+        order. `matrix` names a substitution matrix used instead of match / mismatch.
+        """
+        check_gaps(gap_open, gap_extend)
+        params = (mode, match, mismatch, gap_open, gap_extend, matrix)
+        heap = []
+        for results in self._chunk_results(query, params, n):
+            _merge_top(heap, results, n)
+        return _ranked(heap)
+
+    def top_hits(self, query, mode, match, mismatch, gap_open, gap_extend, n=10, matrix=None):
+        """
+        The `n` best-scoring database sequences as (score, sequence, alignment),
+        best first. Only these hits are traced back.
+        """
+        table = score_table(match, mismatch, matrix)
+        rows = self.top_rows(query, mode, match, mismatch, gap_open, gap_extend, n, matrix)
+        return self._traceback(query, rows, mode, match, mismatch, gap_open, gap_extend, table)
+
+    def _traceback(self, query, rows, mode, match, mismatch, gap_open, gap_extend, table):
+        return [
+            (score, self.sequences[row], align(query, self.sequences[row], mode, match, mismatch, gap_open, gap_extend, table=table))
+            for score, row in rows
+        ]
+
+    def batch_top_hits(self, queries, mode, match, mismatch, gap_open, gap_extend, n=10, matrix=None):
+        """
+        top_hits of every query, yielded as (query index, hits) in the order the
+        queries finish. All (query, chunk) tasks are queued at once, so workers
+        stay busy across query boundaries.
+        """
+        check_gaps(gap_open, gap_extend)
+        params = (mode, match, mismatch, gap_open, gap_extend, matrix)
+        if self._executor is None:
+            for i, query in enumerate(queries):
+                yield i, self.top_hits(query, mode, match, mismatch, gap_open, gap_extend, n, matrix)
+            return
+
+        table = score_table(match, mismatch, matrix)
+        n_chunks = len(self.chunk_rows)
+        tasks = {
+            (i, chunk): (chunk, query, params, n)
+            for i, query in enumerate(queries) for chunk in range(n_chunks)
+        }
+        heaps = [[] for _ in queries]
+        pending = [n_chunks] * len(queries)
+        for (i, _), results in self._run_tasks(tasks):
+            _merge_top(heaps[i], results, n)
+            pending[i] -= 1
+            if not pending[i]:
+                rows = _ranked(heaps[i])
+                yield i, self._traceback(queries[i], rows, mode, match, mismatch, gap_open, gap_extend, table)
+
+
+def get_alignment_pool(dataset):
+    """
+    Worker pool of the current release, shared by every session; replaced with the
+    release. Started by the first alignment that needs it, not by page visits.
+    """
+    return dataset.derived("alignment_pool", lambda ds: AlignmentPool(ds.df["Sequence"]))
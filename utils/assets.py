@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import re
+
+from utils.dataset import BUILD_DIR, get_dataset
+from utils.hashing import file_sha256
+
+# Folders holding per-peptide files, and the file name pattern giving the cNPDB ID.
+# When the same ID appears in several folders of one kind, the folder listed last wins
+# (ESMFold 1244_1516 re-predicts IDs 1245-1364 that are also in 1001_2000).
+ASSET_SOURCES = {
+    'alphafold': (
+        ["Assets/3D Structure AlphaFold 1_1000", "Assets/3D Structure AlphaFold 1001_2000"],
+        re.compile(r"3D cNP (\d+)\.cif"),
+    ),
+    'esmfold': (
+        ["Assets/3D Structure ESMFold 1_1000", "Assets/3D Structure ESMFold 1001_2000",
+         "Assets/3D Structure ESMFold 1244_1516"],
+        re.compile(r"3D Meta cNP(\d+)\.pdb"),
+    ),
+    # MSI images are numbered like the "MSI Tissue N" columns
+    'msi': (
+        ["Assets/MSImaging"],
+        re.compile(r"MSI cNP(\d+) (\d)\.jpeg"),
+    ),
+}
+
+
+def manifest_path(version):
+    return os.path.join(BUILD_DIR, f"assets-{version}.json")
+
+
+class AssetManifest:
+    """
+    Every structure and MSI file of the release, found by listing the asset
+    folders once. Entries are dicts with path, size and sha256; lookups are
+    plain dict accesses and return None when a peptide has no such file.
+    """
+
+    def __init__(self, entries):
+        # {cNPDB ID: {'alphafold': entry, 'esmfold': entry, 'msi': {n: entry}}}
+        self.entries = entries
+
+    @classmethod
+    def scan(cls, sources=ASSET_SOURCES):
+        entries = {}
+        for kind, (folders, pattern) in sources.items():
+            for folder in folders:
+                if not os.path.isdir(folder):
+                    continue
+                for name in sorted(os.listdir(folder)):
+                    match = pattern.fullmatch(name)
+                    if not match:
+                        continue
+                    path = os.path.join(folder, name)
+                    entry = {'path': path, 'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+                    assets = entries.setdefault(int(match.group(1)), {})
+                    if kind == 'msi':
+                        assets.setdefault('msi', {})[int(match.group(2))] = entry
+                    else:
+                        assets[kind] = entry
+        return cls(entries)
+
+    def alphafold(self, cnp_id):
+        return self.entries.get(cnp_id, {}).get('alphafold')
+
+    def esmfold(self, cnp_id):
+        return self.entries.get(cnp_id, {}).get('esmfold')
+
+    def msi(self, cnp_id, n):
+        return self.entries.get(cnp_id, {}).get('msi', {}).get(n)
+
+    def msi_images(self, cnp_id):
+        """[(n, entry)] of a peptide's MSI images, in tissue order."""
+        return sorted(self.entries.get(cnp_id, {}).get('msi', {}).items())
+
+    def files(self, cnp_id):
+        """Every file entry of one peptide."""
+        assets = self.entries.get(cnp_id, {})
+        found = [assets[kind] for kind in ('alphafold', 'esmfold') if kind in assets]
+        return found + [entry for _, entry in self.msi_images(cnp_id)]
+
+    def to_json(self):
+        return {str(cnp_id): assets for cnp_id, assets in sorted(self.entries.items())}
+
+
+def write_manifest(manifest, version):
+    """Save the manifest next to the compiled dataset, for mirrors and scripts."""
+    out_path = manifest_path(version)
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest.to_json(), f, indent=1)
+    os.replace(tmp_path, out_path)
+
+    # Drop manifests of earlier releases
+    for old_path in glob.glob(os.path.join(BUILD_DIR, "assets-*.json")):
+        if old_path != out_path:
+            os.remove(old_path)
+    return out_path
+
+
+def _build_manifest(dataset):
+    manifest = AssetManifest.scan()
+    write_manifest(manifest, dataset.version)
+    return manifest
+
+
+def get_asset_manifest(dataset):
+    return dataset.derived("asset_manifest", _build_manifest)
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.assets
+    dataset = get_dataset()
+    manifest = get_asset_manifest(dataset)
+    print(f"Indexed assets of {len(manifest.entries)} peptides in {manifest_path(dataset.version)}")
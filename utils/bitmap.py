@@ -0,0 +1,59 @@
+import numpy as np
+
+# Row sets are stored as packed bitmaps: one bit per peptide row, 64 rows per uint64
+# word, so set operations cost O(rows / 64) regardless of how many rows are set.
+
+
+def n_words(n_rows):
+    return (n_rows + 63) // 64
+
+
+def empty(n_rows):
+    return np.zeros(n_words(n_rows), dtype=np.uint64)
+
+
+def full(n_rows):
+    return from_mask(np.ones(n_rows, dtype=bool))
+
+
+def from_mask(mask):
+    """Pack a boolean array (one entry per row) into a bitmap."""
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    padded = np.zeros(n_words(len(mask)) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view(np.uint64)
+
+
+def from_indices(indices, n_rows):
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[np.asarray(indices, dtype=np.intp)] = True
+    return from_mask(mask)
+
+
+def to_mask(bits, n_rows):
+    return np.unpackbits(bits.view(np.uint8), count=n_rows, bitorder="little").astype(bool)
+
+
+def to_indices(bits, n_rows):
+    """Row positions set in the bitmap, in ascending order."""
+    return np.flatnonzero(to_mask(bits, n_rows))
+
+
+def union(bitmaps, n_rows):
+    result = empty(n_rows)
+    for bits in bitmaps:
+        np.bitwise_or(result, bits, out=result)
+    return result
+
+
+def intersect(bitmaps, n_rows):
+    result = full(n_rows)
+    for bits in bitmaps:
+        np.bitwise_and(result, bits, out=result)
+    return result
+
+
+def count(bits):
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(bits).sum())
+    return int(np.unpackbits(bits.view(np.uint8)).sum())
@@ -0,0 +1,173 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+
+from utils.dataset import BUILD_DIR, get_dataset
+from utils.range_index import PropertyRangeIndex
+from utils.structure_store import STRUCTURE_KINDS, get_structure_store
+
+# ESMFold writes pLDDT into the B-factor column as 0-1, AlphaFold as 0-100
+PLDDT_SCALE = {'alphafold': 1.0, 'esmfold': 100.0}
+
+# Per-peptide summary columns, aligned with the dataset rows and filterable like the sliders
+MEAN_PLDDT_COLS = {kind: f"Mean pLDDT ({name})" for kind, name in [('alphafold', "AlphaFold"), ('esmfold', "ESMFold")]}
+
+
+def parse_cif_ca(text):
+    """pLDDT (B-factor) and coordinates of every CA atom of the first model of an mmCIF file."""
+    columns = []
+    plddt, coords = [], []
+    model = None
+    for line in text.splitlines():
+        if line.startswith("_atom_site."):
+            columns.append(line.strip()[len("_atom_site."):])
+        elif columns and line.startswith(("ATOM", "HETATM")):
+            fields = dict(zip(columns, line.split()))
+            model = model or fields.get('pdbx_PDB_model_num')
+            if fields.get('pdbx_PDB_model_num') != model:
+                break
+            if fields['label_atom_id'] == "CA":
+                plddt.append(float(fields['B_iso_or_equiv']))
+                coords.append((float(fields['Cartn_x']), float(fields['Cartn_y']), float(fields['Cartn_z'])))
+    return np.array(plddt, dtype=np.float32), np.array(coords, dtype=np.float32).reshape(-1, 3)
+
+
+def parse_pdb_ca(text):
+    """pLDDT (B-factor) and coordinates of every CA atom of the first model of a PDB file."""
+    plddt, coords = [], []
+    for line in text.splitlines():
+        if line.startswith("ENDMDL"):
+            break
+        if line.startswith("ATOM") and line[12:16].strip() == "CA":
+            plddt.append(float(line[60:66]))
+            coords.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+    return np.array(plddt, dtype=np.float32), np.array(coords, dtype=np.float32).reshape(-1, 3)
+
+
+def ca_rmsd(a, b):
+    """CA RMSD after optimal superposition (Kabsch); NaN unless both models have the same residues."""
+    if len(a) != len(b) or len(a) < 3:
+        return np.nan
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    u, s, vt = np.linalg.svd(a.T @ b)
+    # Proper rotation only (no reflection)
+    s[-1] *= np.sign(np.linalg.det(u @ vt))
+    msd = max((np.sum(a * a) + np.sum(b * b) - 2 * s.sum()) / len(a), 0.0)
+    return float(np.sqrt(msd))
+
+
+def store_path(digest):
+    return os.path.join(BUILD_DIR, f"confidence-{digest}.npz")
+
+
+def extract_confidence(structures, out_path):
+    """
+    One pass over every packed structure, saving per-residue pLDDT and CA
+    coordinates (concatenated, with per-peptide offsets) and per-peptide summaries.
+    """
+    parsers = {'alphafold': parse_cif_ca, 'esmfold': parse_pdb_ca}
+    ids = np.unique(structures.entries['cnp_id']).astype(np.int32)
+    arrays = {'ids': ids}
+    cas = {}
+    for kind in STRUCTURE_KINDS:
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        plddt, coords = [], []
+        for i, cnp_id in enumerate(ids):
+            text = structures.text(int(cnp_id), kind)
+            residue_plddt, residue_ca = parsers[kind](text) if text is not None else (np.zeros(0, np.float32), np.zeros((0, 3), np.float32))
+            plddt.append(residue_plddt * PLDDT_SCALE[kind])
+            coords.append(residue_ca)
+            offsets[i + 1] = offsets[i] + len(residue_plddt)
+        cas[kind] = coords
+        arrays[f"{kind}_offsets"] = offsets
+        arrays[f"{kind}_plddt"] = np.concatenate(plddt).astype(np.float32)
+        arrays[f"{kind}_ca"] = np.concatenate(coords).astype(np.float32)
+        arrays[f"{kind}_mean"] = np.array([p.mean() if len(p) else np.nan for p in plddt], dtype=np.float32)
+        arrays[f"{kind}_min"] = np.array([p.min() if len(p) else np.nan for p in plddt], dtype=np.float32)
+    arrays['ca_rmsd'] = np.array(
+        [ca_rmsd(a, b) for a, b in zip(cas['alphafold'], cas['esmfold'])], dtype=np.float32
+    )
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    tmp_path = out_path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, out_path)
+
+    # Drop stores extracted from earlier structure sets
+    for old_path in glob.glob(os.path.join(BUILD_DIR, "confidence-*.npz")):
+        if old_path != out_path:
+            os.remove(old_path)
+    return out_path
+
+
+class ConfidenceStore:
+    """
+    Per-residue pLDDT and CA coordinates of every predicted structure, with
+    mean / minimum pLDDT per model and the CA RMSD between the AlphaFold and
+    ESMFold models. pLDDT is on the 0-100 scale for both models.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.arrays = {name: data[name] for name in data.files}
+        self.ids = self.arrays['ids']
+        self._rows = {int(cnp_id): row for row, cnp_id in enumerate(self.ids)}
+
+    def _slice(self, cnp_id, kind, name):
+        row = self._rows.get(cnp_id)
+        if row is None:
+            return None
+        offsets = self.arrays[f"{kind}_offsets"]
+        start, stop = offsets[row], offsets[row + 1]
+        return self.arrays[f"{kind}_{name}"][start:stop] if stop > start else None
+
+    def plddt(self, cnp_id, kind):
+        return self._slice(cnp_id, kind, "plddt")
+
+    def ca(self, cnp_id, kind):
+        return self._slice(cnp_id, kind, "ca")
+
+    def summary(self, cnp_id):
+        """{'alphafold_mean', 'alphafold_min', 'esmfold_mean', 'esmfold_min', 'ca_rmsd'}, NaN where missing."""
+        row = self._rows.get(cnp_id)
+        names = [f"{kind}_{stat}" for kind in STRUCTURE_KINDS for stat in ("mean", "min")] + ['ca_rmsd']
+        return {name: float(self.arrays[name][row]) if row is not None else np.nan for name in names}
+
+    def column(self, name, cnp_ids):
+        """Summary `name` for each of `cnp_ids` (NaN for peptides without a structure)."""
+        rows = np.array([self._rows.get(int(cnp_id), -1) for cnp_id in cnp_ids])
+        values = self.arrays[name][np.maximum(rows, 0)].astype(float)
+        values[rows < 0] = np.nan
+        return values
+
+
+def _open_store(dataset):
+    structures = get_structure_store(dataset)
+    path = store_path(structures.digest)
+    if not os.path.exists(path):
+        extract_confidence(structures, path)
+    return ConfidenceStore(path)
+
+
+def get_confidence_store(dataset):
+    return dataset.derived("confidence_store", _open_store)
+
+
+def get_confidence_index(dataset):
+    """Sorted mean-pLDDT columns of the dataset rows, for range filters on the search page."""
+    def build(ds):
+        confidence = get_confidence_store(ds)
+        ids = ds.df['cNPDB ID'].to_numpy()
+        columns = pd.DataFrame({
+            col: confidence.column(f"{kind}_mean", ids) for kind, col in MEAN_PLDDT_COLS.items()
+        })
+        return PropertyRangeIndex(columns, columns=list(MEAN_PLDDT_COLS.values()))
+    return dataset.derived("confidence_index", build)
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.confidence
+    store = get_confidence_store(get_dataset())
+    print(f"Extracted confidence of {len(store.ids)} peptides")
@@ -0,0 +1,121 @@
+import glob
+import os
+import threading
+import pandas as pd
+import streamlit as st
+
+from utils.hashing import file_sha256
+
+# Source workbook curated by the lab, and the typed columnar copies compiled from it
+WORKBOOK_PATH = os.path.join("Assets", "20250801_cNPDB.xlsx")
+BUILD_DIR = os.path.join("Assets", "Build")
+
+# Property columns used by the search sliders, coerced once at compile time
+NUMERIC_COLS = [
+    'Monoisotopic Mass', 'Length', 'GRAVY', '% Hydrophobic Residue',
+    'Instability Index Value', 'Isoelectric Point (pI)', 'Net Charge (pH 7.0)',
+    'Aliphatic Index', 'Boman Index',
+]
+
+# The shared table is handed to every session, so writes must never reach it in place.
+# Copy-on-write is always on from pandas 3.0; older versions need the option.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+class Dataset:
+    """
+    One release of cNPDB: the peptide table, the version id it was built from,
+    and any structures derived from it (indexes, vocabularies, artifacts...).
+    A new release gets a new Dataset, so derived structures never go stale.
+    """
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self._derived = {}
+        # Re-entrant: a builder may ask for other derived structures
+        self._lock = threading.RLock()
+
+    def derived(self, name, builder):
+        """
+        Return the structure registered under `name`, building it with
+        builder(dataset) the first time it is asked for in this release.
+        """
+        if name not in self._derived:
+            with self._lock:
+                if name not in self._derived:
+                    self._derived[name] = builder(self)
+        return self._derived[name]
+
+
+def workbook_version(workbook_path=WORKBOOK_PATH):
+    """Short content hash of the workbook, used as the release version id."""
+    return file_sha256(workbook_path)[:16]
+
+
+def compiled_path(version):
+    return os.path.join(BUILD_DIR, f"cNPDB-{version}.parquet")
+
+
+def compile_workbook(workbook_path=WORKBOOK_PATH, version=None):
+    """
+    Parse the Excel workbook once and write it as a Parquet file with the
+    numeric property columns already coerced. Returns the compiled path.
+    """
+    version = version or workbook_version(workbook_path)
+    df = pd.read_excel(workbook_path)
+    for col in NUMERIC_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Excel cells can mix numbers and text in the same column; Parquet needs one type
+    for col in df.columns:
+        if col not in NUMERIC_COLS and df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+
+    out_path = compiled_path(version)
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, out_path)
+
+    # Drop copies compiled from earlier releases
+    for old_path in glob.glob(os.path.join(BUILD_DIR, "cNPDB-*.parquet")):
+        if old_path != out_path:
+            os.remove(old_path)
+    return out_path
+
+
+# (mtime, size) of the workbook -> content version, so the file is only hashed when it changes
+_version_by_stat = {}
+
+
+def current_version(workbook_path=WORKBOOK_PATH):
+    stat = os.stat(workbook_path)
+    key = (workbook_path, stat.st_mtime_ns, stat.st_size)
+    if key not in _version_by_stat:
+        _version_by_stat.clear()
+        _version_by_stat[key] = workbook_version(workbook_path)
+    return _version_by_stat[key]
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_release(version):
+    path = compiled_path(version)
+    if not os.path.exists(path):
+        compile_workbook(version=version)
+    return Dataset(pd.read_parquet(path), version)
+
+
+def get_dataset():
+    """
+    Return the current cNPDB release, shared by every page and session in the
+    process. Editing the workbook produces a new version on the next rerun.
+    """
+    return _load_release(current_version())
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.dataset
+    path = compile_workbook()
+    print(f"Compiled {WORKBOOK_PATH} to {path}")
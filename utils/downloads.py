@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+
+
+class ArtifactCache:
+    """
+    Bounded, thread-safe LRU of generated download files (bytes), keyed by
+    content. Shared by every session of the process, so the same selection is
+    only ever built once while it stays in the cache.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, max_entries=64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        data = build()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self._size += len(data)
+                while self._entries and (self._size > self.max_bytes or len(self._entries) > self.max_entries):
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+
+@st.cache_resource(show_spinner=False)
+def get_artifact_cache():
+    return ArtifactCache()
+
+
+def selection_key(dataset, rows, kind):
+    """Content address of one artifact: release version, file kind and the selected IDs."""
+    digest = hashlib.sha256(f"{dataset.version}:{kind}:".encode())
+    digest.update(rows['cNPDB ID'].to_numpy(dtype="int64").tobytes())
+    return digest.hexdigest()
+
+
+def build_excel(rows, sheet_name="Selected"):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        rows.to_excel(writer, index=False, sheet_name=sheet_name)
+    return buf.getvalue()
+
+
+def build_structure_zip(rows, assets, structures):
+    """
+    ZIP of the AlphaFold CIF, ESMFold PDB and MSI images of the given peptides.
+    Structures are read from the packed `structures` store, MSI images as listed in `assets`.
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zipf:
+        for cnp_id in rows["cNPDB ID"].astype(int):
+            for kind, folder in (("alphafold", "AlphaFold_3D_Structures"), ("esmfold", "ESMfold_3D_Structures")):
+                data = structures.get(cnp_id, kind)
+                if data is not None:
+                    zipf.writestr(f"{folder}/{structures.name(cnp_id, kind)}", data)
+
+            for _, msi_image in assets.msi_images(cnp_id):
+                zipf.write(msi_image["path"], arcname=f"MSI_Images/{os.path.basename(msi_image['path'])}")
+    return buf.getvalue()
+
+
+def lazy_artifact(dataset, rows, kind, build):
+    """
+    Callable for st.download_button(data=...): the file is only generated when
+    the button is clicked, and served from the shared cache if it was built before.
+    """
+    key = selection_key(dataset, rows, kind)
+    return lambda: get_artifact_cache().get_or_build(key, lambda: build(rows))
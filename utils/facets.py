@@ -0,0 +1,71 @@
+import re
+import numpy as np
+import pandas as pd
+
+from utils import bitmap
+
+# Annotation columns offered as multiselect filters on the search page.
+# Multi-value columns hold several terms per cell separated by ';' or ','
+# and match if any selected term is one of them; the others match the whole cell.
+FACET_COLUMNS = {
+    'Family': False,
+    'OS': True,
+    'Tissue': True,
+    'PTM': True,
+    'Existence': False,
+    'Topic': True,
+    'Instrument': True,
+    'Technique': True,
+}
+
+
+def split_terms(cell_value):
+    """Clean individual terms of a multi-value cell (handles ; or , and trims spaces)."""
+    if pd.isna(cell_value):
+        return []
+    return [item.strip() for item in re.split(r'[;,]', str(cell_value)) if item.strip()]
+
+
+class FacetIndex:
+    """
+    Inverted index from each annotation term to the bitmap of rows carrying it,
+    plus the sorted option list of every column, built once per dataset release.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.postings = {}
+        for col, multivalue in FACET_COLUMNS.items():
+            rows_by_term = {}
+            for row, cell_value in enumerate(df[col]):
+                if multivalue:
+                    terms = set(split_terms(cell_value))
+                elif pd.isna(cell_value):
+                    terms = ()
+                else:
+                    terms = (cell_value,)
+                for term in terms:
+                    rows_by_term.setdefault(term, []).append(row)
+            self.postings[col] = {
+                term: bitmap.from_indices(rows, self.n_rows)
+                for term, rows in rows_by_term.items()
+            }
+        self.vocabularies = {col: sorted(postings) for col, postings in self.postings.items()}
+
+    def match(self, col, selected):
+        """Rows matching any of the selected terms of one column (bitmap OR)."""
+        postings = self.postings[col]
+        return bitmap.union(
+            (postings[term] for term in selected if term in postings), self.n_rows
+        )
+
+    def counts(self, col, base):
+        """Number of `base` rows carrying each term of one column."""
+        return {
+            term: bitmap.count(np.bitwise_and(bits, base))
+            for term, bits in self.postings[col].items()
+        }
+
+
+def get_facet_index(dataset):
+    return dataset.derived("facet_index", lambda ds: FacetIndex(ds.df))
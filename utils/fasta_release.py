@@ -0,0 +1,139 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import pandas as pd
+
+from utils import bitmap
+from utils.dataset import BUILD_DIR, get_dataset
+from utils.facets import get_facet_index
+from utils.hashing import file_sha256
+
+FULL_FASTA = "cNPDB_Full_Database.fasta"
+FULL_FASTA_GZ = FULL_FASTA + ".gz"
+CHECKSUMS = "SHA256SUMS"
+
+# Annotation columns the database is also split by, and the sub-folder of each split
+SPLIT_COLUMNS = {'OS': "by_organism", 'Family': "by_family"}
+
+
+def fasta_text(rows):
+    return "\n".join(
+        f">{str(row['ID']).lstrip('>')}\n{str(row['Sequence'])}"
+        for _, row in rows.iterrows()
+        if pd.notna(row['ID']) and pd.notna(row['Sequence'])
+    )
+
+
+def release_dir(version):
+    return os.path.join(BUILD_DIR, f"fasta-{version}")
+
+
+def split_file_name(term, disambiguate=False):
+    """
+    File name of a split. Sanitizing can give different terms the same name;
+    `disambiguate` adds a short hash of the term to tell them apart.
+    """
+    name = re.sub(r"[^\w.-]+", "_", str(term)).strip("_")
+    if disambiguate:
+        name += "-" + hashlib.sha256(str(term).encode("utf-8")).hexdigest()[:8]
+    return name + ".fasta"
+
+
+class FastaRelease:
+    """
+    FASTA files of one dataset release on disk: the full database (plain and
+    gzip) and one file per organism and per family, listed with their SHA-256
+    in SHA256SUMS (sha256sum format) so mirrors can verify them.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.version = manifest["version"]
+        self.checksums = manifest["files"]
+        # {column: {term: relative path}}
+        self.splits = manifest["splits"]
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def reader(self, name):
+        """Callable for st.download_button(data=...), reading the file only on click."""
+        return lambda: self.read(name)
+
+
+def build_fasta_release(dataset):
+    """
+    Write the FASTA files of `dataset` into its release folder (once per
+    version) and return the FastaRelease. Folders of older releases are removed.
+    """
+    out_dir = release_dir(dataset.version)
+    if os.path.exists(os.path.join(out_dir, "manifest.json")):
+        return FastaRelease(out_dir)
+
+    df = dataset.df
+    facet_index = get_facet_index(dataset)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    files = {}
+
+    def write(name, data):
+        path = os.path.join(tmp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        files[name] = file_sha256(path)
+
+    full = fasta_text(df).encode("utf-8")
+    write(FULL_FASTA, full)
+    # mtime=0 keeps the archive, and so its checksum, identical across rebuilds
+    write(FULL_FASTA_GZ, gzip.compress(full, mtime=0))
+
+    splits = {}
+    for col, folder in SPLIT_COLUMNS.items():
+        splits[col] = {}
+        # Lower-cased, as names differing only in case clash on some filesystems
+        taken = set()
+        for term in facet_index.vocabularies[col]:
+            rows = bitmap.to_indices(facet_index.postings[col][term], len(df))
+            name = f"{folder}/{split_file_name(term)}"
+            if name.lower() in taken:
+                name = f"{folder}/{split_file_name(term, disambiguate=True)}"
+            taken.add(name.lower())
+            write(name, fasta_text(df.iloc[rows]).encode("utf-8"))
+            splits[col][term] = name
+
+    with open(os.path.join(tmp_dir, CHECKSUMS), "w", encoding="utf-8") as f:
+        f.writelines(f"{digest}  {name}\n" for name, digest in sorted(files.items()))
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": dataset.version, "files": files, "splits": splits}, f, indent=1, ensure_ascii=False)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+    # Drop files built from earlier releases
+    for old_dir in glob.glob(os.path.join(BUILD_DIR, "fasta-*")):
+        if old_dir != out_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return FastaRelease(out_dir)
+
+
+def get_fasta_release(dataset):
+    return dataset.derived("fasta_release", build_fasta_release)
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.fasta_release
+    release = build_fasta_release(get_dataset())
+    print(f"Wrote {len(release.checksums)} FASTA files to {release.directory}")
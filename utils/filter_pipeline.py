@@ -0,0 +1,30 @@
+import streamlit as st
+
+
+class StageCache:
+    """
+    Last result of each named filter stage in one session, together with the
+    inputs it was computed from. On a rerun a stage is only recomputed if its
+    own inputs changed, so moving one widget re-evaluates one stage.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self._stages = {}
+
+    def get(self, name, inputs, compute):
+        """Result of stage `name` for `inputs` (hashable), calling compute() only on a change."""
+        entry = self._stages.get(name)
+        if entry is None or entry[0] != inputs:
+            entry = (inputs, compute())
+            self._stages[name] = entry
+        return entry[1]
+
+
+def get_stage_cache(dataset, key="search_filter_stages"):
+    """The session's stage cache, emptied whenever a new dataset release is loaded."""
+    cache = st.session_state.get(key)
+    if cache is None or cache.version != dataset.version:
+        cache = StageCache(dataset.version)
+        st.session_state[key] = cache
+    return cache
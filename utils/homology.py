@@ -0,0 +1,328 @@
+import functools
+import math
+from collections import namedtuple
+import numpy as np
+from Bio.Align import substitution_matrices
+
+from utils.alignment import EncodedDatabase, align, check_gaps, database_scores, substitution_table
+
+# Seed words are made of the 20 standard residues (codes 0-19); anything else is 20 and never seeds
+AMINO_ACIDS = "ARNDCQEGHILKMFPSTWYV"
+OTHER = len(AMINO_ACIDS)
+# Robinson & Robinson (1991) background frequencies, as used by BLAST
+BACKGROUND = {
+    'A': 0.07805, 'R': 0.05129, 'N': 0.04487, 'D': 0.05364, 'C': 0.01925,
+    'Q': 0.04264, 'E': 0.06295, 'G': 0.07377, 'H': 0.02199, 'I': 0.05142,
+    'L': 0.09019, 'K': 0.05744, 'M': 0.02243, 'F': 0.03856, 'P': 0.05203,
+    'S': 0.07120, 'T': 0.05841, 'W': 0.01330, 'Y': 0.03216, 'V': 0.06441,
+}
+
+MATRICES = ["BLOSUM62", "BLOSUM80", "BLOSUM45", "PAM30", "PAM70"]
+WORD_SIZES = (2, 3, 4)
+# Neighbourhood words must score at least BLAST's T=11 for 3-letter BLOSUM62 words,
+# per letter and converted to the selected matrix through lambda
+WORD_THRESHOLD_BLOSUM62 = 11 / 3
+# Half-width of the band around the seed diagonal in the gapped stage
+BAND = 8
+# Sequences go on to gapped extension once their best ungapped segment reaches 22 bits
+# (BLAST's gap trigger), or the gapped cutoff score if that is lower
+GAP_TRIGGER_BITS = 22.0
+# Low-complexity (SEG-like) masking of the query: windows of 12 residues below 2.2 bits
+SEG_WINDOW = 12
+SEG_ENTROPY = 2.2
+
+Hit = namedtuple("Hit", ["score", "bits", "evalue", "row", "sequence", "alignment"])
+KarlinAltschul = namedtuple("KarlinAltschul", ["lam", "K", "H"])
+
+# Gapped Karlin-Altschul parameters have no closed form; these are BLAST's published
+# estimates (blast_stat.c) by (gap existence, gap extension) cost, a gap of length k
+# costing existence + k * extension. BLOSUM80 is left out: Biopython's copy is scaled
+# in thirds of a bit and NCBI's in halves, so NCBI's gapped values do not apply.
+GAPPED_KARLIN_ALTSCHUL = {
+    "BLOSUM62": {
+        (11, 2): KarlinAltschul(0.297, 0.082, 0.27), (10, 2): KarlinAltschul(0.291, 0.075, 0.23),
+        (9, 2): KarlinAltschul(0.279, 0.058, 0.19), (8, 2): KarlinAltschul(0.264, 0.045, 0.15),
+        (7, 2): KarlinAltschul(0.239, 0.027, 0.10), (6, 2): KarlinAltschul(0.201, 0.012, 0.061),
+        (13, 1): KarlinAltschul(0.292, 0.071, 0.23), (12, 1): KarlinAltschul(0.283, 0.059, 0.19),
+        (11, 1): KarlinAltschul(0.267, 0.041, 0.14), (10, 1): KarlinAltschul(0.243, 0.024, 0.10),
+        (9, 1): KarlinAltschul(0.206, 0.010, 0.052),
+    },
+    "BLOSUM45": {
+        (13, 3): KarlinAltschul(0.207, 0.049, 0.14), (12, 3): KarlinAltschul(0.199, 0.039, 0.11),
+        (11, 3): KarlinAltschul(0.190, 0.031, 0.095), (10, 3): KarlinAltschul(0.179, 0.023, 0.075),
+        (16, 2): KarlinAltschul(0.210, 0.051, 0.14), (15, 2): KarlinAltschul(0.203, 0.041, 0.12),
+        (14, 2): KarlinAltschul(0.195, 0.032, 0.10), (13, 2): KarlinAltschul(0.185, 0.024, 0.084),
+        (12, 2): KarlinAltschul(0.171, 0.016, 0.061), (19, 1): KarlinAltschul(0.205, 0.040, 0.11),
+        (18, 1): KarlinAltschul(0.198, 0.032, 0.10), (17, 1): KarlinAltschul(0.189, 0.024, 0.079),
+        (16, 1): KarlinAltschul(0.176, 0.016, 0.063),
+    },
+    "PAM30": {
+        (7, 2): KarlinAltschul(0.305, 0.15, 0.87), (6, 2): KarlinAltschul(0.287, 0.11, 0.68),
+        (5, 2): KarlinAltschul(0.264, 0.079, 0.45), (10, 1): KarlinAltschul(0.309, 0.15, 0.88),
+        (9, 1): KarlinAltschul(0.294, 0.11, 0.61), (8, 1): KarlinAltschul(0.270, 0.072, 0.40),
+    },
+    "PAM70": {
+        (8, 2): KarlinAltschul(0.301, 0.12, 0.54), (7, 2): KarlinAltschul(0.286, 0.093, 0.43),
+        (6, 2): KarlinAltschul(0.264, 0.064, 0.29), (11, 1): KarlinAltschul(0.305, 0.12, 0.52),
+        (10, 1): KarlinAltschul(0.291, 0.091, 0.41), (9, 1): KarlinAltschul(0.270, 0.060, 0.28),
+    },
+}
+# Matrices the search reports E-values for, and BLAST's default gap costs of each
+BLAST_MATRICES = list(GAPPED_KARLIN_ALTSCHUL)
+DEFAULT_GAP_COSTS = {"BLOSUM62": (11, 1), "BLOSUM45": (14, 2), "PAM30": (9, 1), "PAM70": (10, 1)}
+
+
+def residue_codes(seq):
+    """0-19 for the standard residues, 20 for anything else."""
+    lookup = np.full(256, OTHER, dtype=np.uint8)
+    for code, letter in enumerate(AMINO_ACIDS):
+        lookup[ord(letter)] = code
+    return lookup[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+@functools.lru_cache(maxsize=None)
+def residue_table(matrix_name):
+    """21x21 matrix scores over residue codes; code 20 scores as X."""
+    letters = AMINO_ACIDS + "X"
+    table = substitution_table(matrix_name)
+    codes = [ord(letter) for letter in letters]
+    return table[np.ix_(codes, codes)]
+
+
+@functools.lru_cache(maxsize=None)
+def karlin_altschul(matrix_name):
+    """
+    Ungapped Karlin-Altschul parameters of a matrix under the background
+    frequencies: lambda solves sum p_i p_j exp(lambda s_ij) = 1, H is the relative
+    entropy and K follows Karlin & Altschul (1990), as computed by BLAST.
+    """
+    matrix = substitution_matrices.load(matrix_name)
+    freqs = np.array([BACKGROUND[a] for a in AMINO_ACIDS])
+    freqs /= freqs.sum()
+    scores = np.array([[matrix[a][b] for b in AMINO_ACIDS] for a in AMINO_ACIDS]).round().astype(int)
+    low, high = scores.min(), scores.max()
+    prob = np.zeros(high - low + 1)
+    np.add.at(prob, (scores - low).ravel(), np.outer(freqs, freqs).ravel())
+    values = np.arange(low, high + 1)
+
+    # lambda by bisection; the expected score is negative, so the root is unique
+    def excess(lam):
+        return np.sum(prob * np.exp(lam * values)) - 1.0
+    lo, hi = 1e-6, 1.0
+    while excess(hi) < 0:
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        lo, hi = (lo, mid) if excess(mid) > 0 else (mid, hi)
+    lam = (lo + hi) / 2
+    H = lam * np.sum(prob * values * np.exp(lam * values))
+
+    # sigma = sum_k 1/k (E[exp(lambda S_k); S_k < 0] + P(S_k >= 0)) over sums S_k of k scores
+    sigma, dist, dist_low = 0.0, np.array([1.0]), 0
+    for k in range(1, 101):
+        dist = np.convolve(dist, prob)
+        dist_low += low
+        sums = np.arange(dist_low, dist_low + len(dist))
+        term = np.sum(dist[sums < 0] * np.exp(lam * sums[sums < 0])) + np.sum(dist[sums >= 0])
+        sigma += term / k
+        if term <= 1e-4:
+            break
+    K = math.exp(-2 * sigma) / ((H / lam) * (1 - math.exp(-lam)))
+    return KarlinAltschul(float(lam), float(K), float(H))
+
+
+def gap_penalties(existence, extension):
+    """(gap_open, gap_extend) scores of the aligners for BLAST gap costs."""
+    return -(existence + extension), -extension
+
+
+def gapped_karlin_altschul(matrix_name, gap_open, gap_extend):
+    """Gapped parameters of a matrix and gap penalties; ValueError if BLAST publishes none."""
+    costs = (-gap_open + gap_extend, -gap_extend)
+    params = GAPPED_KARLIN_ALTSCHUL.get(matrix_name, {}).get(costs)
+    if params is None:
+        raise ValueError(f"No gapped Karlin-Altschul parameters for {matrix_name} with gap costs {costs}")
+    return params
+
+
+def _search_space(query_length, db_length, db_count, params):
+    """K m n, with query and database lengths shortened by the expected alignment length (BLAST's edge correction)."""
+    lam, K, H = params
+    overlap = max(math.log(K * query_length * db_length) / H, 0.0)
+    m = max(query_length - overlap, 1 / K)
+    n = max(db_length - db_count * overlap, 1 / K)
+    return K * m * n
+
+
+def evalue(score, query_length, db_length, db_count, params):
+    """Expected number of chance hits scoring at least `score`: K m n exp(-lambda S)."""
+    return _search_space(query_length, db_length, db_count, params) * math.exp(-params.lam * score)
+
+
+def check_evalue_threshold(evalue_threshold):
+    if not evalue_threshold > 0:
+        raise ValueError(f"E-value threshold must be positive, got {evalue_threshold}")
+
+
+def cutoff_score(evalue_threshold, query_length, db_length, db_count, params):
+    """Lowest score whose E-value is at most `evalue_threshold`."""
+    check_evalue_threshold(evalue_threshold)
+    return math.log(_search_space(query_length, db_length, db_count, params) / evalue_threshold) / params.lam
+
+
+def bit_score(score, params):
+    return (params.lam * score - math.log(params.K)) / math.log(2)
+
+
+def low_complexity_mask(codes, window=SEG_WINDOW, entropy=SEG_ENTROPY):
+    """True for residues inside a window whose composition entropy is below `entropy` bits."""
+    mask = np.zeros(len(codes), dtype=bool)
+    for start in range(len(codes) - window + 1):
+        counts = np.bincount(codes[start:start + window], minlength=OTHER + 1)
+        p = counts[counts > 0] / window
+        if -np.sum(p * np.log2(p)) < entropy:
+            mask[start:start + window] = True
+    return mask
+
+
+class SeedIndex:
+    """
+    Every word of `word_size` standard residues in the database, with the
+    (sequence, position) where it occurs, grouped by word (CSR layout), plus
+    the database residues as codes for ungapped extension.
+    """
+
+    def __init__(self, sequences, word_size):
+        self.sequences = [str(seq) for seq in sequences]
+        self.word_size = word_size
+        self.lengths = np.array([len(seq) for seq in self.sequences], dtype=np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        self.residues = residue_codes("".join(self.sequences))
+        self.total_length = int(self.lengths.sum())
+
+        n_words = OTHER ** word_size
+        rows = np.repeat(np.arange(len(self.sequences)), self.lengths)
+        positions = np.arange(len(self.residues)) - self.starts[rows]
+        # Word starting at every residue; windows running past their sequence or over
+        # a non-standard residue are dropped
+        usable = positions <= self.lengths[rows] - word_size
+        padded = np.concatenate([self.residues, np.full(word_size, OTHER, dtype=np.uint8)])
+        words = np.zeros(len(self.residues), dtype=np.int64)
+        for k in range(word_size):
+            letter = padded[k:k + len(self.residues)]
+            usable &= letter < OTHER
+            words = words * OTHER + np.minimum(letter, OTHER - 1)
+        order = np.argsort(words[usable], kind="stable")
+        self.offsets = np.searchsorted(words[usable][order], np.arange(n_words + 1))
+        self.word_rows = rows[usable][order].astype(np.int32)
+        self.word_positions = positions[usable][order].astype(np.int32)
+        # Letters of every possible word, for scoring query neighbourhoods
+        self.word_letters = np.stack(np.unravel_index(np.arange(n_words), (OTHER,) * word_size), axis=1)
+
+    def seeds(self, query, table, threshold, mask):
+        """
+        (sequence, query position, database position) of every database word scoring
+        at least `threshold` against a query word (or as well as the word itself).
+        """
+        w = self.word_size
+        rows, query_pos, db_pos = [], [], []
+        for start in range(len(query) - w + 1):
+            word = query[start:start + w]
+            if (word >= OTHER).any() or mask[start:start + w].any():
+                continue
+            scores = sum(table[word[k], self.word_letters[:, k]] for k in range(w))
+            self_score = sum(table[letter, letter] for letter in word)
+            neighbours = np.flatnonzero(scores >= min(threshold, self_score))
+            begin, end = self.offsets[neighbours], self.offsets[neighbours + 1]
+            counts = end - begin
+            if not counts.sum():
+                continue
+            # Concatenate the index ranges of all neighbour words
+            index = np.repeat(begin - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            rows.append(self.word_rows[index])
+            db_pos.append(self.word_positions[index])
+            query_pos.append(np.full(len(index), start, dtype=np.int32))
+        if not rows:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty
+        return np.concatenate(rows), np.concatenate(query_pos), np.concatenate(db_pos)
+
+    def ungapped_scores(self, query, table, rows, diagonals):
+        """Best ungapped segment score of the query on each (sequence, diagonal)."""
+        query_pos = np.arange(len(query))
+        db_pos = query_pos[None, :] + diagonals[:, None]
+        inside = (db_pos >= 0) & (db_pos < self.lengths[rows][:, None])
+        db_codes = self.residues[self.starts[rows][:, None] + np.where(inside, db_pos, 0)]
+        scores = np.where(inside, table[query[None, :], db_codes], -1e9)
+        # Maximum subarray: largest rise of the running sum above its running minimum
+        running = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(scores, axis=1)], axis=1)
+        return np.max(running - np.minimum.accumulate(running, axis=1), axis=1)
+
+
+def get_seed_index(dataset, word_size):
+    return dataset.derived(f"seed_index_{word_size}", lambda ds: SeedIndex(ds.df["Sequence"], word_size))
+
+
+def search(query, index, matrix_name, gap_open, gap_extend, evalue_threshold, top_n=10, seg_filter=True):
+    """
+    Seed-and-extend local search of `query` against the indexed database:
+    neighbourhood word seeds, ungapped extension of every seeded diagonal,
+    banded gapped alignment of the promising sequences, then a full local
+    alignment of the reported hits. Returns up to `top_n` Hits with
+    E-value <= `evalue_threshold`, best first. Gap penalties must be one of
+    the combinations of GAPPED_KARLIN_ALTSCHUL (see gap_penalties).
+    """
+    check_gaps(gap_open, gap_extend)
+    check_evalue_threshold(evalue_threshold)
+    table = residue_table(matrix_name)
+    ungapped_params = karlin_altschul(matrix_name)
+    # Reported scores are gapped, so E-values and bits use the gapped parameters
+    params = gapped_karlin_altschul(matrix_name, gap_open, gap_extend)
+    codes = residue_codes(query)
+    n_seqs = len(index.sequences)
+
+    def expect(score):
+        return evalue(score, len(codes), index.total_length, n_seqs, params)
+
+    mask = low_complexity_mask(codes) if seg_filter else np.zeros(len(codes), dtype=bool)
+    threshold = WORD_THRESHOLD_BLOSUM62 * index.word_size * karlin_altschul("BLOSUM62").lam / ungapped_params.lam
+    rows, query_pos, db_pos = index.seeds(codes, table, threshold, mask)
+    if not len(rows):
+        return []
+
+    # One ungapped extension per seeded diagonal; keep each sequence's best diagonal
+    pairs = np.unique(np.stack([rows, db_pos - query_pos], axis=1), axis=0)
+    rows, diagonals = pairs[:, 0], pairs[:, 1]
+    ungapped = index.ungapped_scores(codes, table, rows, diagonals)
+    order = np.lexsort((-ungapped, rows))
+    first = np.concatenate([[True], rows[order][1:] != rows[order][:-1]])
+    best = order[first]
+    rows, diagonals, ungapped = rows[best], diagonals[best], ungapped[best]
+    # Gapped alignment for sequences whose best ungapped segment reaches the gap trigger;
+    # the E-value threshold applies to the gapped score only
+    trigger = min(
+        (GAP_TRIGGER_BITS * math.log(2) + math.log(ungapped_params.K)) / ungapped_params.lam,
+        cutoff_score(evalue_threshold, len(codes), index.total_length, n_seqs, params),
+    )
+    keep = ungapped >= trigger
+    rows, diagonals = rows[keep], diagonals[keep]
+    if not len(rows):
+        return []
+
+    # Banded gapped alignment around the best diagonal
+    full_table = substitution_table(matrix_name)
+    candidates = EncodedDatabase([index.sequences[row] for row in rows])
+    gapped = database_scores(
+        query, candidates, "local", None, None, gap_open, gap_extend,
+        table=full_table, diagonals=diagonals, band=BAND,
+    )
+    passing = [k for k in np.lexsort((rows, -gapped)) if expect(gapped[k]) <= evalue_threshold]
+
+    hits = []
+    for k in passing[:top_n]:
+        sequence = index.sequences[rows[k]]
+        aln = align(query, sequence, "local", None, None, gap_open, gap_extend, table=full_table)
+        score = aln.score if aln else float(gapped[k])
+        hits.append(Hit(score, bit_score(score, params), expect(score), int(rows[k]), sequence, aln))
+    hits.sort(key=lambda hit: (-hit.score, hit.row))
+    return hits
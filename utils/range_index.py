@@ -0,0 +1,55 @@
+import numpy as np
+
+from utils import bitmap
+from utils.dataset import NUMERIC_COLS
+
+
+class PropertyRangeIndex:
+    """
+    Per-column sorted copies of the numeric property columns, built once per
+    dataset release. A closed range [lo, hi] on one column is two binary
+    searches giving a contiguous slice of row ids; missing values never match,
+    as with Series.between().
+    """
+
+    def __init__(self, df, columns=NUMERIC_COLS):
+        self.n_rows = len(df)
+        self.sorted_values = {}
+        self.sorted_rows = {}
+        for col in columns:
+            values = df[col].to_numpy(dtype=float)
+            rows = np.flatnonzero(~np.isnan(values))
+            order = np.argsort(values[rows], kind="stable")
+            self.sorted_values[col] = values[rows][order]
+            self.sorted_rows[col] = rows[order]
+        # Bitmaps of columns whose slider sits at its default range, which never change
+        self._default_bitmaps = {}
+
+    def rows_between(self, col, lo, hi):
+        values = self.sorted_values[col]
+        start = np.searchsorted(values, lo, side="left")
+        stop = np.searchsorted(values, hi, side="right")
+        return self.sorted_rows[col][start:stop]
+
+    def between(self, col, lo, hi):
+        return bitmap.from_indices(self.rows_between(col, lo, hi), self.n_rows)
+
+    def filter(self, ranges, defaults):
+        """
+        Rows inside every (lo, hi) range of `ranges` ({column: (lo, hi)}).
+        Columns left at their `defaults` reuse a bitmap computed once.
+        """
+        bitmaps = []
+        for col, (lo, hi) in ranges.items():
+            if (lo, hi) == tuple(defaults[col]):
+                key = (col, lo, hi)
+                if key not in self._default_bitmaps:
+                    self._default_bitmaps[key] = self.between(col, lo, hi)
+                bitmaps.append(self._default_bitmaps[key])
+            else:
+                bitmaps.append(self.between(col, lo, hi))
+        return bitmap.intersect(bitmaps, self.n_rows)
+
+
+def get_range_index(dataset):
+    return dataset.derived("range_index", lambda ds: PropertyRangeIndex(ds.df))
@@ -0,0 +1,78 @@
+import numpy as np
+import streamlit as st
+
+from utils import bitmap
+
+
+class Selection:
+    """
+    Peptides selected in one session, as a bitset indexed by cNPDB ID (bit i is
+    cNPDB ID i). IDs are stable across filters and releases, so a selection can be
+    built up over several searches. Bulk operations take another ID bitset and cost
+    O(capacity / 64).
+    """
+
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self.bits = bitmap.empty(capacity)
+
+    def ensure_capacity(self, capacity):
+        if capacity > self.capacity:
+            bits = bitmap.empty(capacity)
+            bits[:len(self.bits)] = self.bits
+            self.bits = bits
+            self.capacity = capacity
+
+    def id_bits(self, ids):
+        """Bitset of the given cNPDB IDs, sized like this selection."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids):
+            self.ensure_capacity(int(ids.max()) + 1)
+        return bitmap.from_indices(ids, self.capacity)
+
+    def contains(self, pid):
+        if pid >= self.capacity:
+            return False
+        word, bit = divmod(pid, 64)
+        return bool(self.bits[word] & np.uint64(1 << bit))
+
+    def add(self, pid):
+        self.ensure_capacity(pid + 1)
+        word, bit = divmod(pid, 64)
+        self.bits[word] |= np.uint64(1 << bit)
+
+    def discard(self, pid):
+        if pid < self.capacity:
+            word, bit = divmod(pid, 64)
+            self.bits[word] &= ~np.uint64(1 << bit)
+
+    def mask(self, ids):
+        """Boolean array telling which of `ids` are selected."""
+        ids = np.asarray(ids, dtype=np.int64)
+        selected = bitmap.to_mask(self.bits, self.capacity)
+        in_range = ids < self.capacity
+        return in_range & selected[np.where(in_range, ids, 0)]
+
+    def count(self):
+        return bitmap.count(self.bits)
+
+    def select_all(self, id_bits):
+        """Add every peptide of `id_bits` (e.g. all current results)."""
+        np.bitwise_or(self.bits, id_bits, out=self.bits)
+
+    def invert(self, id_bits):
+        """Flip the selection of every peptide of `id_bits`."""
+        np.bitwise_xor(self.bits, id_bits, out=self.bits)
+
+    def intersect(self, id_bits):
+        """Keep only selected peptides that are also in `id_bits`."""
+        np.bitwise_and(self.bits, id_bits, out=self.bits)
+
+    def clear(self):
+        self.bits[:] = 0
+
+
+def get_selection(key="selection"):
+    if key not in st.session_state:
+        st.session_state[key] = Selection()
+    return st.session_state[key]
@@ -0,0 +1,106 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+import pandas as pd
+
+from utils import bitmap
+
+# Sequences are concatenated with a separator that never occurs in a search token
+# (tokens are split on whitespace), so a match can never span two peptides.
+SEPARATOR = "\n"
+
+
+def build_suffix_array(text):
+    """
+    Start offsets of all suffixes of `text` in sorted order, built by prefix
+    doubling on NumPy arrays (O(n log^2 n), no per-suffix Python work).
+    """
+    n = len(text)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    rank = np.fromiter(map(ord, text), dtype=np.int64, count=n)
+    k = 1
+    while True:
+        # Rank of the suffix k characters further on; -1 past the end sorts shorter suffixes first
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        first_sorted, second_sorted = rank[sa], second[sa]
+        new_group = np.ones(n, dtype=np.int64)
+        new_group[1:] = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.cumsum(new_group) - 1
+        if rank[sa[-1]] == n - 1 or k >= n:
+            return sa
+        k *= 2
+
+
+class SequenceIndex:
+    """
+    Suffix array over one sequence column. Answers exact-substring queries in
+    O(len(token) * log(total residues)) and reports where each token occurs.
+    """
+
+    def __init__(self, sequences):
+        sequences = ["" if pd.isna(seq) else str(seq) for seq in sequences]
+        self.n_rows = len(sequences)
+        self.starts = np.zeros(self.n_rows, dtype=np.int64)
+        offset = 0
+        for row, seq in enumerate(sequences):
+            self.starts[row] = offset
+            offset += len(seq) + len(SEPARATOR)
+        self.text = SEPARATOR.join(sequences) + SEPARATOR
+        self.suffix_array = build_suffix_array(self.text)
+
+    def occurrences(self, token):
+        """(rows, offsets) of every occurrence of `token`, offsets within each row's sequence."""
+        if not token or SEPARATOR in token:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        width = len(token)
+        text = self.text
+
+        def prefix(i):
+            return text[i:i + width]
+
+        lo = bisect_left(self.suffix_array, token, key=prefix)
+        hi = bisect_right(self.suffix_array, token, lo=lo, key=prefix)
+        positions = self.suffix_array[lo:hi]
+        rows = np.searchsorted(self.starts, positions, side="right") - 1
+        return rows, positions - self.starts[rows]
+
+    def search(self, tokens):
+        """Bitmap of rows whose sequence contains any of the tokens."""
+        rows = [self.occurrences(token)[0] for token in tokens]
+        if not rows:
+            return bitmap.empty(self.n_rows)
+        return bitmap.from_indices(np.concatenate(rows), self.n_rows)
+
+    def match_spans(self, tokens, rows=None):
+        """
+        {row: [(start, end), ...]} of every token occurrence, merged where they
+        overlap, for highlighting. Limited to `rows` if given.
+        """
+        wanted = None if rows is None else set(int(row) for row in rows)
+        spans = {}
+        for token in tokens:
+            for row, offset in zip(*self.occurrences(token)):
+                row = int(row)
+                if wanted is None or row in wanted:
+                    spans.setdefault(row, []).append((int(offset), int(offset) + len(token)))
+        for row, row_spans in spans.items():
+            merged = []
+            for start, end in sorted(row_spans):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            spans[row] = merged
+        return spans
+
+
+def parse_query(text):
+    """Space-separated peptide tokens, upper-cased; taken literally, never as a regex."""
+    return [token.upper() for token in text.split()]
+
+
+def get_sequence_index(dataset, col='Sequence'):
+    return dataset.derived(f"sequence_index:{col}", lambda ds: SequenceIndex(ds.df[col]))
@@ -0,0 +1,49 @@
+import os
+import shutil
+import threading
+from urllib.parse import quote
+
+from utils.hashing import file_sha256
+
+# Served by Streamlit at app/static/ (server.enableStaticServing in .streamlit/config.toml).
+# Files are published under a folder named after their content hash, so a URL never
+# changes meaning and browsers can keep reusing their copy (ETag / Last-Modified).
+STATIC_DIR = "static"
+STATIC_ROUTE = "app/static"
+
+# (path, mtime, size) -> URL of every file published by this process
+_published = {}
+_lock = threading.Lock()
+
+
+def _publish(path, sha256):
+    rel_path = os.path.join(sha256[:16], os.path.basename(path))
+    target = os.path.join(STATIC_DIR, rel_path)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        # Hard links cost no space; symlinks would point outside the static folder,
+        # which Streamlit refuses to serve
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+    return f"{STATIC_ROUTE}/{quote(rel_path.replace(os.sep, '/'))}"
+
+
+def static_url(path, sha256=None):
+    """
+    URL the browser can fetch `path` from, publishing the file into the static
+    folder on first use. Pass `sha256` when it is already known (asset manifest).
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    url = _published.get(key)
+    if url is None:
+        with _lock:
+            url = _published.get(key)
+            if url is None:
+                url = _publish(path, sha256 or file_sha256(path))
+                _published[key] = url
+    return url
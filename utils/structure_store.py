@@ -0,0 +1,152 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+
+from utils.assets import get_asset_manifest
+from utils.dataset import BUILD_DIR, get_dataset
+
+# Predicted structures packed into one file:
+#   header | zlib dictionaries | compressed entries | offset table | JSON metadata
+# Each entry is compressed on its own against a preset dictionary of its kind
+# (CIF and PDB headers repeat in every file), so any entry can be read alone.
+MAGIC = b"cNPDBST1"
+HEADER = struct.Struct("<8sQQQ")  # magic, table offset, entry count, metadata offset
+STRUCTURE_KINDS = ['alphafold', 'esmfold']
+ENTRY_DTYPE = np.dtype([
+    ('cnp_id', '<i4'), ('kind', '<u1'), ('offset', '<u8'), ('length', '<u4'), ('size', '<u4'),
+])
+DICTIONARY_SIZE = 32 * 1024
+
+
+def store_path(digest):
+    return os.path.join(BUILD_DIR, f"structures-{digest}.pack")
+
+
+def structures_digest(manifest):
+    """Content id of the structure files listed in the manifest."""
+    digest = hashlib.sha256()
+    for cnp_id in sorted(manifest.entries):
+        for kind in STRUCTURE_KINDS:
+            entry = manifest.entries[cnp_id].get(kind)
+            if entry is not None:
+                digest.update(f"{cnp_id}:{kind}:{entry['sha256']};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _dictionary(samples):
+    """Preset zlib dictionary from the start of every 50th file; the end is weighted most."""
+    return b"".join(sample[:4096] for sample in samples[::50])[-DICTIONARY_SIZE:]
+
+
+def build_store(manifest, out_path):
+    files = {kind: [] for kind in STRUCTURE_KINDS}
+    for cnp_id in sorted(manifest.entries):
+        for kind in STRUCTURE_KINDS:
+            entry = manifest.entries[cnp_id].get(kind)
+            if entry is not None:
+                with open(entry['path'], "rb") as f:
+                    files[kind].append((cnp_id, os.path.basename(entry['path']), f.read()))
+
+    tmp_path = out_path + ".tmp"
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(tmp_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, 0, 0, 0))
+        dictionaries, names, rows = [], [], []
+        for kind_id, kind in enumerate(STRUCTURE_KINDS):
+            zdict = _dictionary([data for _, _, data in files[kind]])
+            dictionaries.append((out.tell(), len(zdict)))
+            out.write(zdict)
+            for cnp_id, name, data in files[kind]:
+                compressor = zlib.compressobj(9, zdict=zdict)
+                packed = compressor.compress(data) + compressor.flush()
+                rows.append((cnp_id, kind_id, out.tell(), len(packed), len(data)))
+                names.append(name)
+                out.write(packed)
+
+        table_offset = out.tell()
+        out.write(np.array(rows, dtype=ENTRY_DTYPE).tobytes())
+        meta_offset = out.tell()
+        out.write(json.dumps({
+            'kinds': STRUCTURE_KINDS, 'dictionaries': dictionaries, 'names': names,
+        }).encode("utf-8"))
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, table_offset, len(rows), meta_offset))
+    os.replace(tmp_path, out_path)
+
+    # Drop packs of earlier structure sets
+    for old_path in glob.glob(os.path.join(BUILD_DIR, "structures-*.pack")):
+        if old_path != out_path:
+            os.remove(old_path)
+    return out_path
+
+
+class StructureStore:
+    """
+    Read-only view of a structure pack. The file is memory-mapped and the
+    offset table is used in place, so reading one structure is one slice
+    and one decompression; nothing else is loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # structures-<digest>.pack
+        self.digest = os.path.basename(path)[len("structures-"):-len(".pack")]
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, table_offset, n_entries, meta_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a cNPDB structure pack")
+        self.entries = np.frombuffer(self._mmap, dtype=ENTRY_DTYPE, count=n_entries, offset=table_offset)
+        meta = json.loads(self._mmap[meta_offset:])
+        self.names = meta['names']
+        self._dictionaries = [bytes(self._mmap[start:start + length]) for start, length in meta['dictionaries']]
+        # (cNPDB ID, kind) -> row of the offset table
+        self._rows = {
+            (int(cnp_id), meta['kinds'][kind]): row
+            for row, (cnp_id, kind) in enumerate(zip(self.entries['cnp_id'], self.entries['kind']))
+        }
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def name(self, cnp_id, kind):
+        """Original file name of a structure, or None if it is not in the store."""
+        row = self._rows.get((cnp_id, kind))
+        return None if row is None else self.names[row]
+
+    def get(self, cnp_id, kind):
+        """Structure file contents (bytes), or None if it is not in the store."""
+        row = self._rows.get((cnp_id, kind))
+        if row is None:
+            return None
+        entry = self.entries[row]
+        start = int(entry['offset'])
+        decompressor = zlib.decompressobj(zdict=self._dictionaries[entry['kind']])
+        return decompressor.decompress(self._mmap[start:start + int(entry['length'])])
+
+    def text(self, cnp_id, kind):
+        data = self.get(cnp_id, kind)
+        return None if data is None else data.decode("utf-8")
+
+
+def _open_store(dataset):
+    manifest = get_asset_manifest(dataset)
+    path = store_path(structures_digest(manifest))
+    if not os.path.exists(path):
+        build_store(manifest, path)
+    return StructureStore(path)
+
+
+def get_structure_store(dataset):
+    return dataset.derived("structure_store", _open_store)
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.structure_store
+    store = get_structure_store(get_dataset())
+    print(f"Packed {len(store.entries)} structures into {store.path} ({os.path.getsize(store.path)} bytes)")
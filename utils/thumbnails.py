@@ -0,0 +1,169 @@
+import glob
+import html
+import os
+import threading
+from PIL import Image, features
+
+from utils.dataset import BUILD_DIR
+from utils.hashing import file_sha256
+from utils.static_assets import static_url
+
+# Images that get display-size derivatives; pages link the originals only for download
+SOURCES = [
+    "Assets/MSImaging",
+    "Assets/Publication_TOC",
+    "Assets/Statistics",
+    "Assets/Img/Home page.png",
+]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Derivatives are named <source sha256 prefix>-<width>.<ext>, so a changed source
+# simply gets new files and unchanged ones are never re-encoded
+THUMBNAIL_DIR = os.path.join(BUILD_DIR, "thumbnails")
+WIDTHS = (320, 640, 1280)
+
+# Best format first; AVIF needs a Pillow built with libavif
+FORMATS = [(ext, pil_format, mime, options) for ext, pil_format, mime, options in [
+    ("avif", "AVIF", "image/avif", {"quality": 60}),
+    ("webp", "WEBP", "image/webp", {"quality": 80, "method": 6}),
+] if features.check(ext)]
+# AVIF encoding is several times slower, so pages only encode missing WebP files on
+# first use; AVIF is offered once the offline build has produced it
+RUNTIME_FORMATS = [fmt for fmt in FORMATS if fmt[0] == "webp"]
+
+# (path, mtime, size) -> Thumbnails of every source used by this process
+_thumbnails = {}
+_lock = threading.Lock()
+
+
+def source_paths(sources=SOURCES):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths += sorted(
+                path for path in glob.glob(os.path.join(source, "*"))
+                if path.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        elif os.path.exists(source):
+            paths.append(source)
+    return paths
+
+
+class Thumbnails:
+    """
+    Resized copies of one source image at each of WIDTHS (never wider than the
+    source) in every available format, written once under THUMBNAIL_DIR.
+    """
+
+    def __init__(self, path, sha256=None):
+        self.path = path
+        self.sha256 = sha256 or file_sha256(path)
+        with Image.open(path) as img:
+            self.size = img.size
+        self.widths = sorted({min(width, self.size[0]) for width in WIDTHS})
+        # Formats whose derivatives are all on disk, looked up on first render
+        self.formats = None
+
+    def file(self, width, ext):
+        return os.path.join(THUMBNAIL_DIR, f"{self.sha256[:16]}-{width}.{ext}")
+
+    def missing(self, formats=FORMATS):
+        return [
+            (width, fmt) for width in self.widths for fmt in formats
+            if not os.path.exists(self.file(width, fmt[0]))
+        ]
+
+    def available_formats(self):
+        return [fmt for fmt in FORMATS if not self.missing([fmt])]
+
+    def build(self, formats=FORMATS):
+        """Write the derivatives that do not exist yet; returns how many were written."""
+        missing = self.missing(formats)
+        if not missing:
+            return 0
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        with Image.open(self.path) as img:
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            for width, (ext, pil_format, _, options) in missing:
+                height = max(1, round(self.size[1] * width / self.size[0]))
+                resized = img if width == self.size[0] else img.resize((width, height), Image.LANCZOS)
+                out_path = self.file(width, ext)
+                tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+                resized.save(tmp_path, format=pil_format, **options)
+                os.replace(tmp_path, out_path)
+        return len(missing)
+
+    def img_html(self, display_width, style="", alt=""):
+        """
+        <picture> offering every format and width to the browser, which picks
+        the smallest file that fills `display_width` CSS pixels.
+        """
+        sizes = f"{int(display_width)}px"
+        if self.formats is None:
+            self.formats = self.available_formats()
+        if not self.formats:
+            # Pillow has no WebP / AVIF encoder (and nothing was built offline): show the original
+            return (
+                f'<img src="{static_url(self.path)}" alt="{html.escape(alt)}" loading="lazy" '
+                f'decoding="async" style="{style}"/>'
+            )
+        sources = []
+        for ext, _, mime, _ in self.formats:
+            srcset = ", ".join(f"{static_url(self.file(width, ext))} {width}w" for width in self.widths)
+            sources.append(f'<source type="{mime}" srcset="{srcset}" sizes="{sizes}">')
+        # Plain fallback: the smallest derivative covering the display width
+        fallback_width = next((width for width in self.widths if width >= display_width), self.widths[-1])
+        src = static_url(self.file(fallback_width, self.formats[-1][0]))
+        return (
+            f'<picture style="display: contents;">{"".join(sources)}'
+            f'<img src="{src}" alt="{html.escape(alt)}" loading="lazy" decoding="async" style="{style}"/>'
+            f'</picture>'
+        )
+
+
+def get_thumbnails(path, sha256=None):
+    """Thumbnails of `path`, building any missing derivative on first use in this process."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    thumbnails = _thumbnails.get(key)
+    if thumbnails is None:
+        with _lock:
+            thumbnails = _thumbnails.get(key)
+            if thumbnails is None:
+                thumbnails = Thumbnails(path, sha256)
+                thumbnails.build(RUNTIME_FORMATS)
+                _thumbnails[key] = thumbnails
+    return thumbnails
+
+
+def thumbnail_html(path, display_width=None, display_height=None, style="", alt="", sha256=None):
+    """
+    Responsive <picture> for `path` shown `display_width` px wide, or
+    `display_height` px high (the width then follows the aspect ratio).
+    """
+    thumbnails = get_thumbnails(path, sha256)
+    if display_width is None:
+        display_width = display_height * thumbnails.size[0] / thumbnails.size[1]
+    return thumbnails.img_html(display_width, style=style, alt=alt)
+
+
+def build_all(sources=SOURCES):
+    """Incremental offline build: encode what is missing, drop derivatives of removed sources."""
+    written = 0
+    keep = set()
+    for path in source_paths(sources):
+        thumbnails = Thumbnails(path)
+        written += thumbnails.build()
+        keep.update(thumbnails.file(width, ext) for width in thumbnails.widths for ext, *_ in FORMATS)
+    removed = 0
+    for old_path in glob.glob(os.path.join(THUMBNAIL_DIR, "*")):
+        if old_path not in keep:
+            os.remove(old_path)
+            removed += 1
+    return written, removed
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.thumbnails
+    written, removed = build_all()
+    print(f"Wrote {written} thumbnails to {THUMBNAIL_DIR}, removed {removed} stale ones")
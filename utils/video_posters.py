@@ -0,0 +1,68 @@
+import glob
+import os
+import shutil
+import subprocess
+import threading
+
+from utils.dataset import BUILD_DIR
+
+# Tutorial videos get a poster frame, shown by <video preload="none"> until played
+VIDEO_SOURCES = ["Assets/Statistics"]
+VIDEO_EXTENSIONS = (".mp4",)
+POSTER_DIR = os.path.join(BUILD_DIR, "posters")
+# Frame taken this far into the video (the first frame is often black), at the display width
+POSTER_TIME = 1.0
+POSTER_WIDTH = 700
+
+
+def video_paths(sources=VIDEO_SOURCES):
+    return [
+        path for source in sources for path in sorted(glob.glob(os.path.join(source, "*")))
+        if path.lower().endswith(VIDEO_EXTENSIONS)
+    ]
+
+
+def poster_path(video_path):
+    return os.path.join(POSTER_DIR, os.path.splitext(os.path.basename(video_path))[0] + ".jpg")
+
+
+def extract_poster(video_path, out_path):
+    """Write one JPEG frame of the video with ffmpeg; False when ffmpeg is not installed."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.{threading.get_ident()}.tmp.jpg"
+    subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-y", "-ss", str(POSTER_TIME), "-i", video_path,
+         "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "4", tmp_path],
+        check=True,
+    )
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def build_all(sources=VIDEO_SOURCES):
+    """Extract posters of new or changed videos and drop those of removed ones; None without ffmpeg."""
+    if shutil.which("ffmpeg") is None:
+        return None
+    written = 0
+    keep = set()
+    for path in video_paths(sources):
+        out_path = poster_path(path)
+        keep.add(out_path)
+        if not os.path.exists(out_path) or os.path.getmtime(out_path) < os.path.getmtime(path):
+            written += extract_poster(path, out_path)
+    for old_path in glob.glob(os.path.join(POSTER_DIR, "*.jpg")):
+        if old_path not in keep:
+            os.remove(old_path)
+    return written
+
+
+if __name__ == "__main__":
+    # Build step: python -m utils.video_posters (needs ffmpeg on the PATH)
+    written = build_all()
+    if written is None:
+        print("ffmpeg not found; no poster frames extracted")
+    else:
+        print(f"Extracted {written} poster frames to {POSTER_DIR}")